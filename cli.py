@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TDH自动登录脚本 - 命令行入口
+每个子命令只导入自己需要的模块，短时运行（cron/单次执行）启动更快
+
+用法:
+    python cli.py run [--profile]          按 config.yaml 运行（等同于 python config.py）
+    python cli.py crawl [--profile]        只爬取配置，不更新数据库
+    python cli.py db-sync                  只更新数据库
+    python cli.py serve                    启动定时调度器
+    python cli.py diff OLD.csv NEW.csv     比较两次爬取的CSV文件
+    python cli.py history TYPE NAME        查询配置值的变化历史（--at 指定时间点）
+    python cli.py drift PATH [PATH ...]    生成跨集群配置漂移报告
+    python cli.py normalize CSV            将爬取CSV规范化为带类型的列（需要numpy）
+    python cli.py record [-o ARCHIVE]      爬取时录制TDH API响应
+    python cli.py replay ARCHIVE           从录制归档回放（不访问TDH）
+    python cli.py prune                    立即执行一次输出目录归档和清理
+    python cli.py bench                    测量各模块的导入耗时
+    python cli.py check-env                检查运行环境（结果会被缓存）
+"""
+
+import time
+
+_START_TIME = time.perf_counter()
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import sys
+
+ENV_CHECK_CACHE_FILE = ".tdh_env_check.json"
+
+# (包名, 导入名)，与 check_environment.py 保持一致
+REQUIRED_PACKAGES = [
+    ("requests", "requests"),
+    ("urllib3", "urllib3"),
+    ("PyYAML", "yaml"),
+    ("pymysql", "pymysql"),
+    ("schedule", "schedule")
+]
+
+
+def _env_check_key() -> dict:
+    """环境检查缓存键：解释器和依赖声明变化时缓存失效"""
+    requirements_mtime = None
+    if os.path.exists("requirements.txt"):
+        requirements_mtime = os.path.getmtime("requirements.txt")
+    return {
+        "executable": sys.executable,
+        "python_version": sys.version,
+        "requirements_mtime": requirements_mtime
+    }
+
+
+def check_environment_cached(force: bool = False) -> bool:
+    """
+    检查运行环境，检查通过的结果会被缓存
+
+    只通过 importlib.util.find_spec 查找依赖包而不真正导入，
+    缓存命中时几乎没有开销。
+
+    Args:
+        force: 是否忽略缓存重新检查
+
+    Returns:
+        bool: 环境检查是否通过
+    """
+    key = _env_check_key()
+    if not force and os.path.exists(ENV_CHECK_CACHE_FILE):
+        try:
+            with open(ENV_CHECK_CACHE_FILE, 'r', encoding='utf-8') as f:
+                if json.load(f) == key:
+                    return True
+        except (OSError, ValueError):
+            pass
+
+    if sys.version_info[:2] < (3, 6):
+        print(f"✗ Python版本不满足要求: {sys.version}")
+        return False
+
+    missing_packages = [
+        package_name for package_name, import_name in REQUIRED_PACKAGES
+        if importlib.util.find_spec(import_name) is None
+    ]
+    if missing_packages:
+        print(f"✗ 缺少依赖包: {', '.join(missing_packages)}")
+        print("请运行 python check_environment.py 或 pip install -r requirements.txt")
+        return False
+
+    try:
+        with open(ENV_CHECK_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(key, f)
+    except OSError:
+        pass
+    return True
+
+
+def _report_startup(command: str):
+    """报告从进程启动到子命令开始执行的耗时"""
+    elapsed_ms = (time.perf_counter() - _START_TIME) * 1000
+    print(f"启动耗时: {elapsed_ms:.1f} ms（子命令: {command}）", file=sys.stderr)
+
+
+def _load_config(args):
+    """导入主模块并加载配置文件"""
+    import config
+    return config, config.ConfigManager(args.config)
+
+
+def cmd_run(args) -> int:
+    """按配置文件运行（定时任务或单次完整流程）"""
+    import config
+    _report_startup(args.command)
+    config.main(args.config, profile=args.profile)
+    return 0
+
+
+def cmd_crawl(args) -> int:
+    """只爬取配置，不更新数据库"""
+    config, config_manager = _load_config(args)
+    _report_startup(args.command)
+    tdh = config.TDHAutoLogin(config_manager)
+    try:
+        tdh.run_full_process(update_database=False, profile=args.profile or None)
+    finally:
+        tdh.shutdown()
+    return 0
+
+
+def cmd_db_sync(args) -> int:
+    """只更新数据库"""
+    config, config_manager = _load_config(args)
+    _report_startup(args.command)
+    tdh = config.TDHAutoLogin(config_manager)
+    try:
+        if not tdh.login():
+            return 1
+        result = tdh.update_database_with_configs()
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return 0 if result.get("success") else 1
+    finally:
+        tdh.shutdown()
+
+
+def cmd_record(args) -> int:
+    """按配置文件运行一次完整流程，同时录制TDH API响应"""
+    config, config_manager = _load_config(args)
+    config_manager.config['replay'] = {'mode': 'record', 'archive': args.output}
+    _report_startup(args.command)
+    tdh = config.TDHAutoLogin(config_manager)
+    try:
+        tdh.run_full_process(profile=args.profile or None)
+    finally:
+        tdh.shutdown()
+    return 0
+
+
+def cmd_replay(args) -> int:
+    """从录制归档全速回放完整流程（爬取和数据库更新），不访问TDH"""
+    config, config_manager = _load_config(args)
+    config_manager.config['replay'] = {'mode': 'replay', 'archive': args.archive}
+    _report_startup(args.command)
+    tdh = config.TDHAutoLogin(config_manager)
+    try:
+        tdh.run_full_process(update_database=False if args.no_db else None, profile=args.profile or None)
+    finally:
+        tdh.shutdown()
+    return 0
+
+
+def cmd_serve(args) -> int:
+    """启动定时调度器（忽略 scheduler.enabled）"""
+    config, config_manager = _load_config(args)
+    _report_startup(args.command)
+    config.run_scheduler(config_manager)
+    return 0
+
+
+def cmd_history(args) -> int:
+    """查询配置历史：指定 --at 时返回该时间点的值，否则返回全部变化区间"""
+    from datetime import datetime
+
+    config, config_manager = _load_config(args)
+    _report_startup(args.command)
+    db_manager = config.DatabaseManager(config_manager)
+    if not db_manager.connect():
+        return 1
+    try:
+        if args.at:
+            rows = db_manager.get_config_at(args.service_type, args.name,
+                                            datetime.fromisoformat(args.at), args.cluster_id)
+        else:
+            rows = db_manager.get_config_history(args.service_type, args.name, args.cluster_id)
+    finally:
+        db_manager.disconnect()
+
+    for row in rows:
+        valid_to = row['valid_to'] or '至今'
+        print(f"[{row['valid_from']} ~ {valid_to}] 集群 {row['cluster_id']} {row['service_name']} "
+              f"{row['config_file']}/{row['name']} = {row['value']}（版本 {row['service_version']}）")
+    print(f"\n共 {len(rows)} 条记录")
+    return 0
+
+
+def _read_crawl_csv(filepath: str) -> dict:
+    """读取爬取CSV，返回 {(集群ID, 服务名, 服务类型, 配置文件, 配置名): 配置值}"""
+    import csv
+
+    configs = {}
+    with open(filepath, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            key = (row.get('cluster_id', ''), row.get('service_name', ''), row.get('service_type', ''),
+                   row.get('config_configFile', ''), row.get('config_name', ''))
+            configs[key] = row.get('config_value', '')
+    return configs
+
+
+def cmd_diff(args) -> int:
+    """比较两次爬取的CSV文件，输出新增、删除和值变化的配置"""
+    _report_startup(args.command)
+    old_configs = _read_crawl_csv(args.old)
+    new_configs = _read_crawl_csv(args.new)
+
+    added = sorted(key for key in new_configs if key not in old_configs)
+    removed = sorted(key for key in old_configs if key not in new_configs)
+    changed = sorted(
+        key for key in new_configs
+        if key in old_configs and new_configs[key] != old_configs[key]
+    )
+
+    for key in added:
+        print(f"+ {'/'.join(key)} = {new_configs[key]}")
+    for key in removed:
+        print(f"- {'/'.join(key)} = {old_configs[key]}")
+    for key in changed:
+        print(f"~ {'/'.join(key)}: {old_configs[key]} -> {new_configs[key]}")
+
+    print(f"\n新增: {len(added)}, 删除: {len(removed)}, 变化: {len(changed)}")
+    return 1 if (added or removed or changed) else 0
+
+
+def cmd_drift(args) -> int:
+    """基于多个集群的爬取CSV生成配置漂移报告"""
+    import drift_report
+
+    _report_startup(args.command)
+    summary = drift_report.generate_drift_report(args.paths, args.output, args.min_instances, args.latest)
+    print(f"读取 {summary['csv_files']} 个CSV文件，{summary['config_groups']} 个配置分组，"
+          f"{summary['drifted_configs']} 个配置存在漂移")
+    print(f"漂移报告已保存到: {summary['output_file']}")
+    return 0
+
+
+def cmd_prune(args) -> int:
+    """按 retention 配置立即执行一次输出目录归档和清理"""
+    config, config_manager = _load_config(args)
+    _report_startup(args.command)
+    stats = config.OutputRetentionManager(config_manager).run_once()
+    print(f"归档目录: {stats['runs_archived']}, 删除归档: {stats['archives_deleted']}, "
+          f"删除目录: {stats['runs_deleted']}")
+    return 0
+
+
+def cmd_normalize(args) -> int:
+    """将爬取CSV规范化为带类型的列，并标记与推荐值不一致的配置"""
+    try:
+        import normalize_configs
+    except ImportError:
+        print("✗ 缺少依赖包: numpy（pip install numpy）")
+        return 1
+
+    _report_startup(args.command)
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(args.csv))
+    timestamp = os.path.splitext(os.path.basename(args.csv))[0].replace('tdh_configs_', '')
+    summary = normalize_configs.normalize_crawl(normalize_configs.read_crawl_csv(args.csv), output_dir, timestamp)
+    print(f"规范化 {summary['rows']} 行（可选值 {summary['option_rows']} 行），取值类型: {summary['value_kinds']}")
+    print(f"{summary['differs_from_recommended']} 个配置与推荐值不一致，耗时 {summary['normalize_seconds']} 秒")
+    print(f"规范化表已保存到: {summary['table_file']}")
+    print(f"可选值表已保存到: {summary['options_file']}")
+    return 0
+
+
+def cmd_bench(args) -> int:
+    """依次测量各模块的导入耗时（已被前面模块导入的依赖不再计时）"""
+    _report_startup(args.command)
+    modules = ["yaml", "urllib3", "requests", "pymysql", "schedule", "config"]
+    total_ms = 0.0
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"{name:<10} 导入失败: {str(e)}")
+            continue
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        total_ms += elapsed_ms
+        print(f"{name:<10} {elapsed_ms:8.1f} ms")
+    print(f"{'total':<10} {total_ms:8.1f} ms")
+    return 0
+
+
+def cmd_check_env(args) -> int:
+    """检查运行环境（忽略缓存）"""
+    passed = check_environment_cached(force=True)
+    if passed:
+        print("✓ 环境检查通过")
+    return 0 if passed else 1
+
+
+# 需要完整运行环境的子命令
+ENV_CHECKED_COMMANDS = {"run", "crawl", "db-sync", "serve", "history", "record", "replay"}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="TDH自动登录脚本")
+    parser.add_argument("-c", "--config", default="config.yaml", help="配置文件路径（默认: config.yaml）")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="按配置文件运行（定时任务或单次完整流程）")
+    run_parser.add_argument("--profile", action="store_true", help="分阶段记录性能分析数据")
+    run_parser.set_defaults(func=cmd_run)
+
+    crawl_parser = subparsers.add_parser("crawl", help="只爬取配置，不更新数据库")
+    crawl_parser.add_argument("--profile", action="store_true", help="分阶段记录性能分析数据")
+    crawl_parser.set_defaults(func=cmd_crawl)
+    subparsers.add_parser("db-sync", help="只更新数据库").set_defaults(func=cmd_db_sync)
+    subparsers.add_parser("serve", help="启动定时调度器").set_defaults(func=cmd_serve)
+
+    record_parser = subparsers.add_parser("record", help="运行一次完整流程并录制TDH API响应")
+    record_parser.add_argument("-o", "--output", default="tdh_replay.jsonl.gz", help="录制归档（默认: tdh_replay.jsonl.gz）")
+    record_parser.add_argument("--profile", action="store_true", help="分阶段记录性能分析数据")
+    record_parser.set_defaults(func=cmd_record)
+
+    replay_parser = subparsers.add_parser("replay", help="从录制归档回放完整流程（不访问TDH）")
+    replay_parser.add_argument("archive", help="录制归档")
+    replay_parser.add_argument("--no-db", action="store_true", help="不更新数据库")
+    replay_parser.add_argument("--profile", action="store_true", help="分阶段记录性能分析数据")
+    replay_parser.set_defaults(func=cmd_replay)
+
+    diff_parser = subparsers.add_parser("diff", help="比较两次爬取的CSV文件")
+    diff_parser.add_argument("old", help="旧的CSV文件")
+    diff_parser.add_argument("new", help="新的CSV文件")
+    diff_parser.set_defaults(func=cmd_diff)
+
+    history_parser = subparsers.add_parser("history", help="查询配置值的变化历史")
+    history_parser.add_argument("service_type", help="服务类型，如 HDFS")
+    history_parser.add_argument("name", help="配置名")
+    history_parser.add_argument("--at", help="时间点（ISO格式，如 2026-01-01T12:00:00），只返回该时间点的值")
+    history_parser.add_argument("--cluster-id", type=int, help="集群ID（默认查询所有集群）")
+    history_parser.set_defaults(func=cmd_history)
+
+    drift_parser = subparsers.add_parser("drift", help="生成跨集群配置漂移报告")
+    drift_parser.add_argument("paths", nargs="+", help="爬取输出的CSV文件或目录（目录下递归查找 tdh_configs_*.csv），每个路径对应一个TDH管理节点")
+    drift_parser.add_argument("-o", "--output", default="config_drift.csv", help="输出文件（默认: config_drift.csv）")
+    drift_parser.add_argument("--min-instances", type=int, default=2, help="至少有多少个服务实例才参与比较（默认: 2）")
+    drift_parser.add_argument("--latest", action="store_true",
+                              help="目录只读取最新CSV所在的爬取文件夹（最近一次全量爬取及其后的监视轮询），不读取历史爬取")
+    drift_parser.set_defaults(func=cmd_drift)
+
+    subparsers.add_parser("prune", help="立即执行一次输出目录归档和清理").set_defaults(func=cmd_prune)
+    normalize_parser = subparsers.add_parser("normalize", help="将爬取CSV规范化为带类型的列")
+    normalize_parser.add_argument("csv", help="爬取输出的CSV文件")
+    normalize_parser.add_argument("-o", "--output-dir", help="输出目录（默认与CSV文件相同）")
+    normalize_parser.set_defaults(func=cmd_normalize)
+
+    subparsers.add_parser("bench", help="测量各模块的导入耗时").set_defaults(func=cmd_bench)
+    subparsers.add_parser("check-env", help="检查运行环境").set_defaults(func=cmd_check_env)
+    return parser
+
+
+def main(argv=None) -> int:
+    """主函数"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.command:
+        args.command = "run"
+        args.func = cmd_run
+        args.profile = False
+
+    if args.command in ENV_CHECKED_COMMANDS and not check_environment_cached():
+        return 1
+    try:
+        return args.func(args)
+    except FileNotFoundError as e:
+        print(f"\n错误: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
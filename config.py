@@ -12,19 +12,33 @@ import requests
 import json
 import urllib3
 import ssl
+import io
+import http.client
 from requests.adapters import HTTPAdapter
 from urllib3.util.ssl_ import create_urllib3_context
+from urllib3.util.request import ACCEPT_ENCODING
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
 import time
 import os
+import re
+from urllib.parse import urlparse
 import yaml
-from datetime import datetime
-import csv
-import pymysql
-from pymysql.cursors import DictCursor
+from datetime import datetime, timedelta
 import threading
-import schedule
+import zlib
+import multiprocessing
+import hashlib
+import shutil
+import zipfile
+import gzip
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import ijson
+except ImportError:  # 可选依赖，未安装时配置列表回退为整体解析
+    ijson = None
 
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -39,6 +53,7 @@ class ConfigManager:
     
     def __init__(self, config_file: str = "config.yaml"):
         self.config_file = config_file
+        self.config_mtime = None
         self.config = self.load_config()
     
     def load_config(self) -> Dict:
@@ -48,6 +63,7 @@ class ConfigManager:
                 logger.error(f"配置文件 {self.config_file} 不存在")
                 raise FileNotFoundError(f"配置文件 {self.config_file} 不存在")
             
+            self.config_mtime = os.path.getmtime(self.config_file)
             with open(self.config_file, 'r', encoding='utf-8') as f:
                 config = yaml.safe_load(f)
             
@@ -57,6 +73,43 @@ class ConfigManager:
             logger.error(f"加载配置文件失败: {str(e)}")
             raise
     
+    def reload_if_changed(self) -> List[str]:
+        """
+        配置文件修改时间变化时重新解析（未变化时直接使用已解析的配置）
+        
+        Returns:
+            List[str]: 发生变化的顶层配置段，未变化、解析失败或内容不完整时为空
+        """
+        try:
+            mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            return []
+        if mtime == self.config_mtime:
+            return []
+        
+        old_config = self.config
+        try:
+            new_config = self.load_config()
+        except Exception:
+            # 解析失败时保留旧配置，等待下一次修改
+            logger.warning("配置文件重新加载失败，继续使用旧配置")
+            self.config_mtime = mtime
+            return []
+        if not isinstance(new_config, dict):
+            # 空文件或写到一半的文件解析结果不是字典（如None），同样保留旧配置
+            logger.warning("配置文件内容不完整（顶层不是配置段字典），继续使用旧配置")
+            self.config_mtime = mtime
+            return []
+        
+        self.config = new_config
+        changed_sections = sorted(
+            section for section in set(old_config) | set(new_config)
+            if old_config.get(section) != new_config.get(section)
+        )
+        if changed_sections:
+            logger.info(f"配置文件已重新加载，变化的配置段: {', '.join(changed_sections)}")
+        return changed_sections
+    
     def get_tdh_config(self) -> Dict:
         """获取TDH配置"""
         return self.config.get('tdh', {})
@@ -80,24 +133,642 @@ class ConfigManager:
     def get_features_config(self) -> Dict:
         """获取功能开关配置"""
         return self.config.get('features', {})
+    
+    def get_write_behind_config(self) -> Dict:
+        """获取数据库写后缓冲配置"""
+        return self.config.get('write_behind', {})
+    
+    def get_crawl_config(self) -> Dict:
+        """获取爬取配置"""
+        return self.config.get('crawl', {})
+    
+    def get_coordination_config(self) -> Dict:
+        """获取多实例协调配置"""
+        return self.config.get('coordination', {})
+    
+    def get_checkpoint_config(self) -> Dict:
+        """获取检查点配置"""
+        return self.config.get('checkpoint', {})
+    
+    def get_retention_config(self) -> Dict:
+        """获取输出保留配置"""
+        return self.config.get('retention', {})
+    
+    def get_http_config(self) -> Dict:
+        """获取HTTP连接配置"""
+        return self.config.get('http', {})
+    
+    def get_replay_config(self) -> Dict:
+        """获取录制回放配置"""
+        return self.config.get('replay', {})
+    
+    def get_rate_limit_config(self) -> Dict:
+        """获取自适应限流配置"""
+        return self.config.get('rate_limit', {})
+
+
+class _SessionCachingSSLSocket(ssl.SSLSocket):
+    """关闭前把TLS会话交给所属上下文缓存（TLS 1.3的会话票据在握手后才收到）"""
+
+    def close(self):
+        remember = getattr(self.context, 'remember_session', None)
+        if remember:
+            remember(self)
+        super(_SessionCachingSSLSocket, self).close()
+
+
+class ResumableSSLContext(ssl.SSLContext):
+    """
+    支持TLS会话恢复的SSL上下文（跳过证书验证）
+
+    新连接携带同一主机上一次握手得到的TLS会话，服务端支持时跳过完整握手。
+    """
+
+    sslsocket_class = _SessionCachingSSLSocket
+
+    def __new__(cls):
+        return super(ResumableSSLContext, cls).__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self):
+        self.check_hostname = False
+        self.verify_mode = ssl.CERT_NONE
+        self.minimum_version = ssl.TLSVersion.TLSv1_2
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.stats = {"handshakes": 0, "resumed": 0}
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and server_hostname:
+            session = self._cached_session(server_hostname)
+
+        try:
+            ssl_sock = super(ResumableSSLContext, self).wrap_socket(
+                sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+                suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname, session=session
+            )
+        except ValueError:
+            # 缓存的会话不可用（例如协议版本变化），改为完整握手
+            ssl_sock = super(ResumableSSLContext, self).wrap_socket(
+                sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+                suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname
+            )
+
+        with self._lock:
+            self.stats["handshakes"] += 1
+            if do_handshake_on_connect and ssl_sock.session_reused:
+                self.stats["resumed"] += 1
+        self.remember_session(ssl_sock)
+        return ssl_sock
+
+    def remember_session(self, ssl_sock: ssl.SSLSocket):
+        """缓存连接上可用的TLS会话"""
+        if not ssl_sock.server_hostname:
+            return
+        try:
+            session = ssl_sock.session
+        except (AttributeError, ValueError):
+            session = None
+        if session is not None and (session.has_ticket or ssl_sock.version() != 'TLSv1.3'):
+            with self._lock:
+                self._sessions[ssl_sock.server_hostname] = session
+
+    def _cached_session(self, server_hostname: str):
+        """获取主机最近一次缓存的TLS会话"""
+        with self._lock:
+            return self._sessions.get(server_hostname)
+
+
+def _create_insecure_ssl_context(tls_session_resumption: bool = True) -> ssl.SSLContext:
+    """创建跳过证书验证的SSL上下文"""
+    if tls_session_resumption:
+        return ResumableSSLContext()
+    context = create_urllib3_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _counting_pool_classes(counter: Dict[str, int], lock: threading.Lock) -> Dict[str, type]:
+    """
+    创建每次实际建立连接（connect()，包括连接对象断开后的重连）时计数的连接池类
+
+    Args:
+        counter: 计数字典，连接数累加到 counter["connects"]
+        lock: 保护计数的锁
+
+    Returns:
+        Dict: {协议: 连接池类}，用于 PoolManager.pool_classes_by_scheme
+    """
+    pool_classes = {}
+    for scheme, pool_cls in urllib3.poolmanager.pool_classes_by_scheme.items():
+        connection_cls = pool_cls.ConnectionCls
+
+        def connect(self, _base=connection_cls):
+            _base.connect(self)
+            with lock:
+                counter["connects"] += 1
+
+        pool_classes[scheme] = type(pool_cls.__name__, (pool_cls,), {
+            'ConnectionCls': type(connection_cls.__name__, (connection_cls,), {'connect': connect})
+        })
+    return pool_classes
 
 
 class SSLAdapter(HTTPAdapter):
-    """自定义SSL适配器，跳过SSL证书验证"""
-    
+    """
+    自定义SSL适配器，跳过SSL证书验证
+
+    所有连接池共享同一个SSL上下文（可复用TLS会话），连接池大小可配置。
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 tls_session_resumption: bool = True, **kwargs):
+        # HTTPAdapter.__init__ 会调用 init_poolmanager，SSL上下文需要先创建
+        self.ssl_context = _create_insecure_ssl_context(tls_session_resumption)
+        super(SSLAdapter, self).__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                         pool_block=pool_block, **kwargs)
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        # 反序列化的适配器不会经过 __init__
+        if getattr(self, 'ssl_context', None) is None:
+            self.ssl_context = _create_insecure_ssl_context()
+        return self.ssl_context
+
+    def _get_pool_classes(self) -> Dict[str, type]:
+        if getattr(self, '_pool_classes', None) is None:
+            self._connect_stats = {"connects": 0}
+            self._connect_lock = threading.Lock()
+            self._pool_classes = _counting_pool_classes(self._connect_stats, self._connect_lock)
+        return self._pool_classes
+
     def init_poolmanager(self, *args, **kwargs):
-        context = create_urllib3_context()
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        kwargs['ssl_context'] = context
-        return super(SSLAdapter, self).init_poolmanager(*args, **kwargs)
+        kwargs['ssl_context'] = self._get_ssl_context()
+        super(SSLAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._get_pool_classes()
 
     def proxy_manager_for(self, *args, **kwargs):
-        context = create_urllib3_context()
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        kwargs['ssl_context'] = context
-        return super(SSLAdapter, self).proxy_manager_for(*args, **kwargs)
+        kwargs['ssl_context'] = self._get_ssl_context()
+        manager = super(SSLAdapter, self).proxy_manager_for(*args, **kwargs)
+        manager.pool_classes_by_scheme = self._get_pool_classes()
+        return manager
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """
+        获取连接复用统计
+
+        新建连接数按实际建立的连接计数（包括服务器关闭连接后同一连接对象的重连），
+        而不是连接池创建的连接对象数。
+
+        Returns:
+            Dict: 新建连接数、请求数、连接复用率和TLS握手/会话恢复次数
+        """
+        requests_count = 0
+        for manager in [self.poolmanager] + list(self.proxy_manager.values()):
+            for key in list(manager.pools.keys()):
+                try:
+                    pool = manager.pools[key]
+                except KeyError:
+                    continue
+                requests_count += pool.num_requests
+        with self._connect_lock:
+            connections = self._connect_stats["connects"]
+        stats = {
+            "transport": "http/1.1",
+            "connections_opened": connections,
+            "requests": requests_count,
+            "connection_reuse_ratio": round(1 - connections / requests_count, 3) if requests_count else 0.0
+        }
+        stats.update({f"tls_{key}": value for key, value in getattr(self.ssl_context, 'stats', {}).items()})
+        return stats
+
+
+class _HTTP2RawResponse(io.BytesIO):
+    """为requests提供的原始响应对象，使cookies提取和流式读取（response.raw）照常工作"""
+
+    def __init__(self, content: bytes, header_items: List[tuple]):
+        super(_HTTP2RawResponse, self).__init__(content)
+        self.decode_content = True
+        message = http.client.HTTPMessage()
+        for name, value in header_items:
+            message.add_header(name, value)
+        self._original_response = self
+        self.msg = message
+
+    def info(self):
+        return self.msg
+
+
+def _build_buffered_response(adapter: HTTPAdapter, request, status_code: int, reason: str,
+                             header_items: List[tuple], content: bytes, wire_bytes: int,
+                             stream: bool) -> requests.Response:
+    """由已完整读取（已解压）的响应内容构造requests响应对象"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = reason
+    response.headers = requests.structures.CaseInsensitiveDict(header_items)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+    response.raw = _HTTP2RawResponse(content, header_items)
+    response.raw.wire_bytes = wire_bytes
+    if not stream:
+        response._content = content
+    requests.cookies.extract_cookies_to_jar(response.cookies, request, response.raw)
+    return response
+
+
+class _CountingReader:
+    """统计流式读取的解压后字节数"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class HTTP2Adapter(HTTPAdapter):
+    """
+    基于httpx的HTTP/2传输适配器（可选依赖：pip install "httpx[http2]"）
+
+    同一主机的所有请求在一条HTTP/2连接上多路复用，跳过证书验证。
+    """
+
+    # HTTP/2禁止携带的逐跳首部
+    HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'}
+
+    def __init__(self, pool_maxsize: int = 10, **kwargs):
+        import httpx
+
+        super(HTTP2Adapter, self).__init__(**kwargs)
+        self._httpx = httpx
+        self.client = httpx.Client(
+            http2=True,
+            verify=False,
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        )
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "http2_responses": 0}
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        httpx = self._httpx
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        headers = [
+            (name, value) for name, value in request.headers.items()
+            if name.lower() not in self.HOP_BY_HOP_HEADERS
+        ]
+
+        try:
+            httpx_response = self.client.request(
+                request.method, request.url, headers=headers, content=request.body, timeout=timeout
+            )
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        with self._lock:
+            self.stats["requests"] += 1
+            if httpx_response.http_version == "HTTP/2":
+                self.stats["http2_responses"] += 1
+
+        return _build_buffered_response(
+            self, request, httpx_response.status_code, httpx_response.reason_phrase,
+            httpx_response.headers.multi_items(), httpx_response.content,
+            httpx_response.num_bytes_downloaded, stream
+        )
+
+    def close(self):
+        self.client.close()
+        super(HTTP2Adapter, self).close()
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """获取HTTP/2传输统计"""
+        with self._lock:
+            return dict(self.stats, transport="http/2")
+
+
+class ReplayArchive:
+    """
+    TDH API响应的录制归档（gzip压缩的JSON Lines，每行一个响应）
+
+    以 "方法 路径?查询参数" 为键，与 base_url 无关；同一请求录制多次时以最后一次为准。
+    只录制GET请求的状态码、Content-Type和解压后的响应内容，不录制登录请求和cookies。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.responses = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    @staticmethod
+    def request_key(method: str, url: str) -> str:
+        parsed = urlparse(url)
+        path = f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path
+        return f"{method.upper()} {path}"
+
+    def load(self) -> int:
+        """
+        读取归档（录制中途退出导致文件不完整时保留已读取的部分）
+
+        Returns:
+            int: 不同请求的数量
+        """
+        self.responses = {}
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.responses[entry['key']] = entry
+        except (EOFError, ValueError) as e:
+            logger.warning(f"录制归档 {self.path} 不完整，只使用已读取的 {len(self.responses)} 个响应: {str(e)}")
+        logger.info(f"已加载录制归档 {self.path}，共 {len(self.responses)} 个响应")
+        return len(self.responses)
+
+    def open_for_recording(self):
+        """创建新的归档文件（覆盖已有文件）"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        logger.info(f"开始录制TDH API响应到: {self.path}")
+
+    def record(self, key: str, status_code: int, content_type: str, content: bytes):
+        """追加一个响应"""
+        entry = {
+            "key": key,
+            "status": status_code,
+            "content_type": content_type,
+            # surrogateescape 保证非UTF-8内容也能原样还原
+            "body": content.decode('utf-8', 'surrogateescape')
+        }
+        with self._lock:
+            if self.responses.get(key) == entry:
+                # 同一流程中重复请求（如爬取和数据库更新阶段）且响应相同时不重复写入
+                return
+            self.responses[key] = entry
+            if self._file:
+                self._file.write(json.dumps(entry) + '\n')
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.responses.get(key)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+                logger.info(f"录制完成，共 {len(self.responses)} 个响应: {self.path}")
+
+
+class RecordingAdapter(HTTPAdapter):
+    """包装实际的传输适配器，把GET响应写入录制归档，其余行为不变"""
+
+    def __init__(self, inner: HTTPAdapter, archive: ReplayArchive):
+        super(RecordingAdapter, self).__init__()
+        self.inner = inner
+        self.archive = archive
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        response = self.inner.send(request, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        # 完整读取（并解压）响应内容后录制，流式读取改为读取缓冲的内容
+        content = response.content
+        wire_bytes = getattr(response.raw, 'wire_bytes', None)
+        if wire_bytes is None:
+            try:
+                wire_bytes = response.raw.tell()
+            except (AttributeError, ValueError):
+                wire_bytes = len(content)
+        if request.method == 'GET':
+            self.archive.record(ReplayArchive.request_key(request.method, request.url),
+                                response.status_code, response.headers.get('Content-Type', ''), content)
+        
+        header_items = list(response.headers.items())
+        response.raw = _HTTP2RawResponse(content, header_items)
+        response.raw.wire_bytes = wire_bytes
+        return response
+
+    def close(self):
+        self.inner.close()
+        super(RecordingAdapter, self).close()
+
+    def connection_stats(self) -> Dict[str, Any]:
+        if hasattr(self.inner, 'connection_stats'):
+            return dict(self.inner.connection_stats(), recording=self.archive.path)
+        return {"recording": self.archive.path}
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    从录制归档返回响应的传输适配器，不访问网络
+
+    登录请求总是成功；归档中没有的请求返回404。
+    """
+
+    def __init__(self, archive: ReplayArchive):
+        super(ReplayAdapter, self).__init__()
+        self.archive = archive
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "missing": 0}
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = ReplayArchive.request_key(request.method, request.url)
+        entry = self.archive.get(key)
+        if entry is None and request.method == 'POST' and urlparse(request.url).path.endswith('/api/users/login'):
+            entry = {"status": 200, "content_type": "application/json", "body": "{}"}
+        
+        with self._lock:
+            self.stats["requests"] += 1
+            if entry is None:
+                self.stats["missing"] += 1
+        if entry is None:
+            logger.warning(f"录制归档中没有该请求的响应: {key}")
+            entry = {"status": 404, "content_type": "text/plain", "body": ""}
+        
+        content = entry["body"].encode('utf-8', 'surrogateescape')
+        return _build_buffered_response(
+            self, request, entry["status"], http.client.responses.get(entry["status"], ''),
+            [('Content-Type', entry["content_type"])], content, len(content), stream
+        )
+
+    def connection_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, transport="replay", archive=self.archive.path)
+
+
+class StageProfiler:
+    """
+    单次运行的分阶段性能分析
+
+    每个阶段单独记录cProfile数据（.prof，可用snakeviz查看）和tracemalloc内存峰值，
+    并汇总为 profile_summary_*.json。cProfile只统计主线程，工作进程和线程池中的耗时不计入。
+    """
+
+    def __init__(self, output_dir: str, enabled: bool = True, top_allocations: int = 10):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.top_allocations = top_allocations
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """分析一个阶段，未启用时不产生任何开销"""
+        if not self.enabled:
+            yield
+            return
+
+        import cProfile
+        import tracemalloc
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.clear_traces()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+            prof_file = os.path.join(self.output_dir, f"profile_{self.timestamp}_{name}.prof")
+            profiler.dump_stats(prof_file)
+            top_stats = snapshot.statistics('lineno')[:self.top_allocations]
+            self.stages.append({
+                "stage": name,
+                "seconds": round(elapsed, 3),
+                "peak_memory_bytes": peak,
+                "retained_memory_bytes": current,
+                "profile_file": prof_file,
+                "top_allocations": [
+                    {"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                    for stat in top_stats
+                ]
+            })
+            logger.info(f"阶段 {name} 耗时 {elapsed:.3f}s，内存峰值 {peak / 1024 / 1024:.1f} MB")
+
+    def save_summary(self) -> str:
+        """
+        保存各阶段的分析汇总
+
+        Returns:
+            str: 汇总文件路径，未启用或没有阶段时返回空字符串
+        """
+        if not self.enabled or not self.stages:
+            return ""
+        summary_file = os.path.join(self.output_dir, f"profile_summary_{self.timestamp}.json")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump({"timestamp": self.timestamp, "stages": self.stages}, f, indent=2, ensure_ascii=False)
+        logger.info(f"性能分析结果已保存到: {summary_file}（可用 snakeviz 查看 .prof 文件）")
+        return summary_file
+
+
+class AdaptiveRateLimiter:
+    """
+    AIMD自适应限流器
+
+    请求延迟低于目标值时线性提高请求速率和并发数，
+    延迟升高、429或5xx时按比例降低，使爬取速度跟随TDH Manager的负载变化。
+    """
+
+    def __init__(self, config_manager: ConfigManager):
+        rate_config = config_manager.get_rate_limit_config()
+        self.min_rate = rate_config.get('min_rate', 0.5)
+        self.max_rate = rate_config.get('max_rate', 20)
+        self.increase_step = rate_config.get('increase_step', 0.2)
+        self.decrease_factor = rate_config.get('decrease_factor', 0.5)
+        self.target_latency = rate_config.get('target_latency', 1.0)
+        self.max_concurrency = rate_config.get('max_concurrency', 4)
+        self.rate = min(max(rate_config.get('initial_rate', 2), self.min_rate), self.max_rate)
+        self.concurrency = 1.0
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._next_time = 0.0
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "backoffs": 0,
+            "total_latency": 0.0
+        }
+
+    def acquire(self):
+        """等待并发名额和速率令牌"""
+        with self._cond:
+            while self._in_flight >= int(self.concurrency):
+                self._cond.wait()
+            self._in_flight += 1
+            now = time.monotonic()
+            wait = max(0.0, self._next_time - now)
+            self._next_time = max(now, self._next_time) + 1.0 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, latency: float, status_code: int = None, retry_after: str = None):
+        """
+        归还并发名额，并根据本次请求结果调整速率
+
+        Args:
+            latency: 请求延迟（秒）
+            status_code: 响应状态码，请求异常时为None
+            retry_after: 429响应的Retry-After头
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self.stats["requests"] += 1
+            self.stats["total_latency"] += latency
+
+            if status_code == 429:
+                self.stats["throttled"] += 1
+            elif status_code is not None and status_code >= 500:
+                self.stats["server_errors"] += 1
+
+            overloaded = (status_code is None or status_code == 429 or status_code >= 500
+                          or latency > self.target_latency)
+            if overloaded:
+                self.stats["backoffs"] += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+                if status_code == 429 and retry_after and retry_after.isdigit():
+                    self._next_time = max(self._next_time, time.monotonic() + int(retry_after))
+                logger.warning(f"TDH Manager负载升高（状态码: {status_code}, 延迟: {latency:.2f}s），"
+                               f"请求速率降至 {self.rate:.2f}/s，并发 {int(self.concurrency)}")
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取当前速率和统计信息"""
+        with self._cond:
+            requests_count = self.stats["requests"]
+            return {
+                "current_rate": round(self.rate, 2),
+                "current_concurrency": int(self.concurrency),
+                "requests": requests_count,
+                "throttled": self.stats["throttled"],
+                "server_errors": self.stats["server_errors"],
+                "backoffs": self.stats["backoffs"],
+                "avg_latency": round(self.stats["total_latency"] / requests_count, 3) if requests_count else 0.0
+            }
 
 
 class DatabaseManager:
@@ -114,6 +785,10 @@ class DatabaseManager:
     
     def connect(self) -> bool:
         """连接数据库"""
+        # 按需导入，只爬取不写库时不加载数据库驱动
+        import pymysql
+        from pymysql.cursors import DictCursor
+        
         try:
             self.connection = pymysql.connect(
                 host=self.host,
@@ -137,16 +812,17 @@ class DatabaseManager:
             self.connection.close()
             logger.info("数据库连接已断开")
     
-    def save_service(self, service_version: str, service_type: str) -> Optional[int]:
+    def save_service(self, service_version: str, service_type: str, raise_errors: bool = False) -> Optional[int]:
         """
         保存服务信息到数据库
         
         Args:
             service_version: 服务版本
             service_type: 服务类型
+            raise_errors: 是否抛出唯一约束冲突以外的错误（默认记录日志后返回None）
             
         Returns:
-            int: 服务ID，失败返回None
+            int: 服务ID，服务已存在或失败返回None
         """
         try:
             if not self.connection:
@@ -171,15 +847,18 @@ class DatabaseManager:
                 return None  # 返回None，表示不处理此服务
             else:
                 logger.error(f"保存服务信息失败: {str(e)}")
+                if raise_errors:
+                    raise
                 return None
     
-    def save_pull_config(self, service_id: int, config_data: Dict) -> bool:
+    def save_pull_config(self, service_id: int, config_data: Dict, raise_errors: bool = False) -> bool:
         """
         保存配置信息到数据库
         
         Args:
             service_id: 服务ID
             config_data: 配置数据
+            raise_errors: 是否抛出唯一约束冲突以外的错误（默认记录日志后返回False）
             
         Returns:
             bool: 保存是否成功
@@ -197,14 +876,7 @@ class DatabaseManager:
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
                 
-                # 处理values字段，如果是列表则转换为JSON字符串，否则存[]
-                values = config_data.get('values', [])
-                if not values:
-                    values_str = '[]'
-                elif isinstance(values, list):
-                    values_str = json.dumps(values, ensure_ascii=False)
-                else:
-                    values_str = str(values)
+                values_str = self._values_to_str(config_data.get('values', []))
 
                 cursor.execute(sql, (
                     service_id,
@@ -228,10 +900,27 @@ class DatabaseManager:
                 return True  # 返回True表示"处理成功"，只是忽略而已
             else:
                 logger.error(f"保存配置信息失败: {str(e)}")
+                if raise_errors:
+                    raise
                 return False
     
-    def clear_old_data(self):
-        """清空旧数据（可选，用于完全重新同步）"""
+    @staticmethod
+    def _values_to_str(values) -> str:
+        """处理values字段，如果是列表则转换为JSON字符串，否则存[]"""
+        if not values:
+            return '[]'
+        elif isinstance(values, list):
+            return json.dumps(values, ensure_ascii=False)
+        else:
+            return str(values)
+    
+    def clear_old_data(self, raise_errors: bool = False):
+        """
+        清空旧数据（可选，用于完全重新同步）
+        
+        Args:
+            raise_errors: 是否抛出错误（默认记录日志后忽略）
+        """
         try:
             if not self.connection:
                 logger.error("数据库未连接")
@@ -244,95 +933,1363 @@ class DatabaseManager:
                 
         except Exception as e:
             logger.error(f"清空旧数据失败: {str(e)}")
-
-
-class TDHAutoLogin:
-    """TDH自动登录类"""
+            if raise_errors:
+                raise
     
-    def __init__(self, config_manager: ConfigManager):
-        self.config_manager = config_manager
-        
-        # 获取配置
-        tdh_config = config_manager.get_tdh_config()
-        output_config = config_manager.get_output_config()
-        request_config = config_manager.get_request_config()
-        
-        self.base_url = tdh_config.get('base_url', 'https://localhost:8180')
-        self.username = tdh_config.get('username', 'admin')
-        self.password = tdh_config.get('password', 'admin')
-        self.cluster_id = tdh_config.get('cluster_id', 1)
+    def ensure_config_history_table(self):
+        """
+        创建配置历史表（不存在时）
         
-        self.session = requests.Session()
+        每行是一个配置值的有效区间 [valid_from, valid_to)，valid_to 为NULL表示当前值；
+        只在值变化时写入新行，存储量与变化次数成正比。
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS config_history (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                cluster_id INT NOT NULL,
+                service_name VARCHAR(128) NOT NULL,
+                service_type VARCHAR(128) NOT NULL,
+                service_version VARCHAR(128) NOT NULL DEFAULT '',
+                config_file VARCHAR(255) NOT NULL DEFAULT '',
+                name VARCHAR(255) NOT NULL,
+                value TEXT,
+                recommended_value TEXT,
+                `values` TEXT,
+                value_hash CHAR(40) NOT NULL,
+                valid_from DATETIME NOT NULL,
+                valid_to DATETIME NULL,
+                KEY idx_config_history_name (service_type, name, valid_from),
+                KEY idx_config_history_open (cluster_id, valid_to, service_name)
+            ) DEFAULT CHARSET=utf8mb4
+            """)
+    
+    @staticmethod
+    def _config_history_hash(config_data: Dict) -> str:
+        """配置值指纹：值、推荐值、可选值或服务版本任一变化即视为变化"""
+        payload = json.dumps([
+            config_data.get('value', ''),
+            config_data.get('recommendedValue', ''),
+            config_data.get('values', []),
+            config_data.get('service_version', '')
+        ], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def record_config_history(self, cluster_id: int, configs: List[Dict], observed_at: datetime) -> Dict[str, int]:
+        """
+        将一次爬取的配置与当前有效的历史记录比较，只为变化的配置关闭旧区间、写入新区间
         
-        # 配置SSL适配器
-        adapter = SSLAdapter()
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        只比较本次爬取涉及的服务，未爬取的服务保持不变；
+        本次爬取的服务中已不存在的配置会被关闭。
         
-        # 设置请求头
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        Args:
+            cluster_id: 集群ID
+            configs: 爬取得到的配置行（包含 service_name、service_type、service_version 和原始配置字段）
+            observed_at: 本次爬取的时间
+            
+        Returns:
+            Dict: 新增、变化、删除和未变化的配置数
+        """
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        service_names = sorted({config.get('service_name', '') for config in configs})
+        if not service_names:
+            return stats
         
-        self.is_logged_in = False
+        self.ensure_config_history_table()
         
-        # 创建输出目录
-        self.output_dir = output_config.get('output_dir', 'tdh_configs')
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+        with self.connection.cursor() as cursor:
+            # 一次性读取当前有效的记录
+            placeholders = ", ".join(["%s"] * len(service_names))
+            cursor.execute(
+                f"SELECT id, service_name, config_file, name, value_hash FROM config_history "
+                f"WHERE cluster_id = %s AND valid_to IS NULL AND service_name IN ({placeholders})",
+                [cluster_id] + service_names
+            )
+            open_rows = {
+                (row['service_name'], row['config_file'], row['name']): (row['id'], row['value_hash'])
+                for row in cursor.fetchall()
+            }
         
-        # 为每次爬取创建独立的时间戳文件夹
-        self.session_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.session_output_dir = os.path.join(self.output_dir, f"crawl_{self.session_timestamp}")
-        if not os.path.exists(self.session_output_dir):
-            os.makedirs(self.session_output_dir)
+        close_ids = []
+        inserts = []
+        seen_keys = set()
+        for config in configs:
+            key = (config.get('service_name', ''), config.get('configFile', ''), config.get('name', ''))
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            
+            value_hash = self._config_history_hash(config)
+            current = open_rows.get(key)
+            if current and current[1] == value_hash:
+                stats["unchanged"] += 1
+                continue
+            if current:
+                close_ids.append(current[0])
+                stats["changed"] += 1
+            else:
+                stats["added"] += 1
+            inserts.append((
+                cluster_id, key[0], config.get('service_type', ''), config.get('service_version', ''), key[1], key[2],
+                config.get('value', ''), config.get('recommendedValue', ''),
+                self._values_to_str(config.get('values', [])), value_hash, observed_at
+            ))
         
-        # 初始化数据库管理器
-        self.db_manager = DatabaseManager(config_manager)
+        removed_ids = [row_id for key, (row_id, _) in open_rows.items() if key not in seen_keys]
+        stats["removed"] = len(removed_ids)
+        close_ids.extend(removed_ids)
         
-        # 配置参数
-        self.save_config_file = output_config.get('save_config_file', True)
-        self.verbose_logging = output_config.get('verbose_logging', True)
-        self.timeout = request_config.get('timeout', 30)
-        self.delay = request_config.get('delay', 0.5)
-        self.max_retries = request_config.get('max_retries', 3)
+        if not close_ids and not inserts:
+            return stats
         
-        # 设置日志级别
-        if self.verbose_logging:
-            logging.getLogger().setLevel(logging.INFO)
-        else:
-            logging.getLogger().setLevel(logging.WARNING)
+        self.connection.begin()
+        try:
+            with self.connection.cursor() as cursor:
+                for start in range(0, len(close_ids), 1000):
+                    chunk = close_ids[start:start + 1000]
+                    cursor.execute(
+                        f"UPDATE config_history SET valid_to = %s WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                        [observed_at] + chunk
+                    )
+                if inserts:
+                    cursor.executemany("""
+                    INSERT INTO config_history
+                    (cluster_id, service_name, service_type, service_version, config_file, name,
+                     value, recommended_value, `values`, value_hash, valid_from)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, inserts)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return stats
     
-    def login(self, username: str = None, password: str = None) -> bool:
+    def get_config_at(self, service_type: str, name: str, at: datetime, cluster_id: int = None) -> List[Dict]:
         """
-        登录TDH系统
+        查询某个时间点的配置值
         
         Args:
-            username: 用户名（可选，默认使用配置文件中的用户名）
-            password: 密码（可选，默认使用配置文件中的密码）
+            service_type: 服务类型
+            name: 配置名
+            at: 时间点
+            cluster_id: 集群ID（可选，默认查询所有集群）
             
         Returns:
-            bool: 登录是否成功
+            List[Dict]: 该时间点有效的配置记录（每个集群、服务、配置文件一条）
         """
-        # 使用配置文件中的用户名和密码作为默认值
-        if username is None:
-            username = self.username
-        if password is None:
-            password = self.password
-            
-        try:
-            login_url = f"{self.base_url}/api/users/login"
+        sql = """
+        SELECT cluster_id, service_name, service_type, service_version, config_file, name, value,
+               recommended_value, `values`, valid_from, valid_to
+        FROM config_history
+        WHERE service_type = %s AND name = %s AND valid_from <= %s
+          AND (valid_to IS NULL OR valid_to > %s)
+        """
+        params = [service_type, name, at, at]
+        if cluster_id is not None:
+            sql += " AND cluster_id = %s"
+            params.append(cluster_id)
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql + " ORDER BY cluster_id, service_name, config_file", params)
+            return list(cursor.fetchall())
+    
+    def get_config_history(self, service_type: str, name: str, cluster_id: int = None) -> List[Dict]:
+        """
+        查询配置值的变化历史
+        
+        Args:
+            service_type: 服务类型
+            name: 配置名
+            cluster_id: 集群ID（可选，默认查询所有集群）
             
-            login_data = {
-                "userName": username,
-                "userPassword": password,
-                "captcha": "",
-                "twoStepCode": ""
-            }
+        Returns:
+            List[Dict]: 按生效时间排序的有效区间
+        """
+        sql = """
+        SELECT cluster_id, service_name, service_type, service_version, config_file, name, value,
+               recommended_value, `values`, valid_from, valid_to
+        FROM config_history
+        WHERE service_type = %s AND name = %s
+        """
+        params = [service_type, name]
+        if cluster_id is not None:
+            sql += " AND cluster_id = %s"
+            params.append(cluster_id)
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql + " ORDER BY cluster_id, service_name, config_file, valid_from", params)
+            return list(cursor.fetchall())
+
+
+class WriteBehindQueue:
+    """
+    数据库写后缓冲队列
+
+    爬取到的配置批次先以JSON文件形式落盘，再由后台线程写入数据库。
+    数据库缓慢或不可用时爬取不会被阻塞，已拉取的数据也不会丢失，
+    未写入的批次会在数据库恢复（或下次启动）后继续写入。
+    """
+
+    def __init__(self, config_manager: ConfigManager):
+        wb_config = config_manager.get_write_behind_config()
+        output_dir = config_manager.get_output_config().get('output_dir', 'tdh_configs')
+        self.queue_dir = wb_config.get('queue_dir') or os.path.join(output_dir, 'db_queue')
+        self.max_pending_batches = wb_config.get('max_pending_batches', 1000)
+        self.enqueue_timeout = wb_config.get('enqueue_timeout', 5)
+        self.retry_initial_delay = wb_config.get('retry_initial_delay', 1)
+        self.retry_max_delay = wb_config.get('retry_max_delay', 60)
+        self.flush_timeout = wb_config.get('flush_timeout', 60)
+
+        if not os.path.exists(self.queue_dir):
+            os.makedirs(self.queue_dir)
+
+        # 写入线程使用独立的数据库连接，pymysql连接不能跨线程共享
+        self.db_manager = DatabaseManager(config_manager)
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self._pending = len(self._list_pending())
+        self.stats = {
+            "batches_enqueued": 0,
+            "batches_written": 0,
+            "configs_written": 0,
+            "failed_attempts": 0
+        }
+
+        if self._pending:
+            logger.info(f"写后缓冲队列中有 {self._pending} 个待写入批次")
+
+    def _list_pending(self) -> List[str]:
+        """按入队顺序列出待写入的批次文件"""
+        return sorted(
+            os.path.join(self.queue_dir, name)
+            for name in os.listdir(self.queue_dir)
+            if name.endswith('.json')
+        )
+
+    def pending_count(self) -> int:
+        """获取待写入的批次数"""
+        with self._cond:
+            return self._pending
+
+    def enqueue(self, batch: Dict) -> str:
+        """
+        将一个批次写入本地队列
+
+        队列已满时最多等待 enqueue_timeout 秒（背压），超时后仍然落盘，
+        保证已拉取的数据不丢失。
+
+        Args:
+            batch: 批次数据
+
+        Returns:
+            str: 批次文件路径
+        """
+        with self._cond:
+            deadline = time.time() + self.enqueue_timeout
+            while self._pending >= self.max_pending_batches:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logger.warning(f"写后缓冲队列已满（{self._pending} 个批次），继续落盘以避免数据丢失")
+                    break
+                self._cond.wait(remaining)
+
+            self._seq += 1
+            filename = f"{int(time.time() * 1000000):020d}_{os.getpid()}_{self._seq:06d}.json"
+            filepath = os.path.join(self.queue_dir, filename)
+            tmp_path = filepath + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(batch, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, filepath)
+
+            self._pending += 1
+            self.stats["batches_enqueued"] += 1
+            self._cond.notify_all()
+        return filepath
+
+    def enqueue_service(self, service: Dict, configs: List[Dict]) -> str:
+        """将一个服务及其配置作为批次入队"""
+        return self.enqueue({
+            "op": "save_service",
+            "service_name": service.get('name', 'Unknown'),
+            "service_version": service.get('version', ''),
+            "service_type": service.get('type', ''),
+            "configs": configs or [],
+            "enqueued_at": datetime.now().isoformat()
+        })
+
+    def enqueue_clear(self) -> str:
+        """将清空旧数据操作入队，保证其在后续批次之前执行"""
+        return self.enqueue({"op": "clear_old_data", "enqueued_at": datetime.now().isoformat()})
+
+    def start(self):
+        """启动后台写入线程（重复调用无副作用）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+        logger.info(f"写后缓冲写入线程已启动，队列目录: {self.queue_dir}")
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        等待队列写空
+
+        Args:
+            timeout: 最长等待时间（秒），默认使用配置中的 flush_timeout
+
+        Returns:
+            bool: 队列是否已写空
+        """
+        if timeout is None:
+            timeout = self.flush_timeout
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._pending > 0:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, flush: bool = True):
+        """停止后台写入线程，未写入的批次保留在磁盘上"""
+        if flush and self._thread and self._thread.is_alive():
+            if not self.flush():
+                logger.warning(f"写后缓冲队列未能在超时前写空，剩余 {self.pending_count()} 个批次将在下次运行时写入")
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.db_manager.disconnect()
+        self.db_manager.connection = None
+
+    def _run(self):
+        """后台写入循环：按顺序写入批次，失败时指数退避重试（任何异常都不会结束写入线程）"""
+        delay = self.retry_initial_delay
+        while not self._stop_event.is_set():
+            try:
+                delay = self._run_once(delay)
+            except Exception as e:
+                self.stats["failed_attempts"] += 1
+                logger.error(f"写后缓冲：写入循环发生错误，{delay} 秒后重试: {str(e)}")
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, self.retry_max_delay)
+
+    def _run_once(self, delay: float) -> float:
+        """
+        写入一轮待写入的批次
+
+        Args:
+            delay: 当前的重试等待时间（秒）
+
+        Returns:
+            float: 下一轮的重试等待时间（秒）
+        """
+        pending = self._list_pending()
+        if not pending:
+            with self._cond:
+                # 加锁后重新确认：其他进程（如同时运行的 db-sync）可能已写完共享队列目录中的批次
+                if not self._list_pending():
+                    self._pending = 0
+                    self._cond.notify_all()
+                    self._cond.wait(1.0)
+            return delay
+
+        if not self.db_manager.connection and not self.db_manager.connect():
+            self.stats["failed_attempts"] += 1
+            logger.warning(f"写后缓冲：数据库不可用，{delay} 秒后重试（待写入 {len(pending)} 个批次）")
+            self._stop_event.wait(delay)
+            return min(delay * 2, self.retry_max_delay)
+
+        for filepath in pending:
+            if self._stop_event.is_set():
+                break
+            if not self._write_batch(filepath):
+                self.stats["failed_attempts"] += 1
+                self.db_manager.disconnect()
+                self.db_manager.connection = None
+                logger.warning(f"写后缓冲：批次写入失败，{delay} 秒后重试")
+                self._stop_event.wait(delay)
+                return min(delay * 2, self.retry_max_delay)
+            delay = self.retry_initial_delay
+        return delay
+
+    def _write_batch(self, filepath: str) -> bool:
+        """
+        在一个事务中写入单个批次，成功后删除批次文件
+
+        批次文件已不存在时视为已被其他进程（共享同一队列目录）写入。
+        """
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                batch = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"写后缓冲：批次已被其他进程写入: {os.path.basename(filepath)}")
+            self._ack()
+            return True
+        except OSError as e:
+            logger.error(f"写后缓冲：读取批次 {os.path.basename(filepath)} 失败: {str(e)}")
+            return False
+        except ValueError as e:
+            logger.error(f"写后缓冲：批次文件损坏，已移出队列: {filepath} ({str(e)})")
+            try:
+                os.replace(filepath, filepath + '.bad')
+            except OSError:
+                pass
+            self._ack()
+            return True
+
+        connection = self.db_manager.connection
+        try:
+            connection.begin()
+            configs_written = 0
+            # 唯一约束冲突以外的错误（锁等待超时、死锁、数据过长等）都抛出，
+            # 整个批次回滚并保留在队列中重试，不会在连接仍然可用时被提交后删除
+            if batch.get('op') == 'clear_old_data':
+                self.db_manager.clear_old_data(raise_errors=True)
+            else:
+                service_id = self.db_manager.save_service(
+                    batch.get('service_version', ''),
+                    batch.get('service_type', ''),
+                    raise_errors=True
+                )
+                if service_id:
+                    for config in batch.get('configs', []):
+                        if self.db_manager.save_pull_config(service_id, config, raise_errors=True):
+                            configs_written += 1
+            connection.commit()
+        except Exception as e:
+            logger.error(f"写后缓冲：写入批次 {os.path.basename(filepath)} 失败: {str(e)}")
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            return False
+
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+        self.stats["batches_written"] += 1
+        self.stats["configs_written"] += configs_written
+        self._ack()
+        return True
+
+    def _ack(self):
+        """批次处理完成，释放队列空间"""
+        with self._cond:
+            self._pending = max(self._pending - 1, 0)
+            self._cond.notify_all()
+
+
+class CrawlCheckpoint:
+    """
+    按服务记录的爬取和数据库写入检查点
+
+    完整流程中每个服务爬取到的配置行（zlib压缩）和数据库写入状态都会落盘到
+    output_dir/checkpoint，进程中途退出后，下次运行跳过已完成的服务继续执行。
+    失败的服务进入重试队列，成功后移出，连续失败 max_attempts 次后放弃。
+    """
+
+    def __init__(self, config_manager: ConfigManager):
+        checkpoint_config = config_manager.get_checkpoint_config()
+        output_dir = config_manager.get_output_config().get('output_dir', 'tdh_configs')
+        self.checkpoint_dir = checkpoint_config.get('dir') or os.path.join(output_dir, 'checkpoint')
+        self.rows_dir = os.path.join(self.checkpoint_dir, 'rows')
+        self.state_file = os.path.join(self.checkpoint_dir, 'state.json')
+        self.resume_max_age_minutes = checkpoint_config.get('resume_max_age_minutes', 60)
+        self.max_attempts = checkpoint_config.get('max_attempts', 5)
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.rows_dir):
+            os.makedirs(self.rows_dir)
+        self.state = self._load()
+        if self.state["failed"]:
+            logger.info(f"重试队列中有 {len(self.state['failed'])} 个失败的服务")
+
+    def _load(self) -> Dict:
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"检查点文件无法读取，重新开始: {str(e)}")
+        return {"run": None, "failed": {}}
+
+    def _save(self):
+        """原子写入检查点（调用方持有锁）"""
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_file)
+
+    def _rows_path(self, service_id) -> str:
+        return os.path.join(self.rows_dir, f"{service_id}.json.zz")
+
+    def _clear_rows(self):
+        for name in os.listdir(self.rows_dir):
+            os.remove(os.path.join(self.rows_dir, name))
+
+    def begin_run(self, cluster_id: int) -> bool:
+        """
+        开始一次完整流程：上次流程未完成（进程中途退出）且未过期时从检查点继续
+
+        Args:
+            cluster_id: 集群ID
+
+        Returns:
+            bool: 是否从检查点恢复
+        """
+        with self._lock:
+            run = self.state.get("run")
+            if run and run["cluster_id"] == cluster_id:
+                age = datetime.now() - datetime.fromisoformat(run["started_at"])
+                if age <= timedelta(minutes=self.resume_max_age_minutes):
+                    logger.info(f"从检查点恢复 {run['started_at']} 开始的流程：已爬取 {len(run['crawled'])} 个服务，"
+                                f"已写入数据库 {len(run['db_written'])} 个服务")
+                    return True
+                logger.info(f"检查点已过期（{run['started_at']}），重新开始")
+            self._clear_rows()
+            self.state["run"] = {
+                "cluster_id": cluster_id,
+                "started_at": datetime.now().isoformat(),
+                "crawled": {},
+                "db_written": []
+            }
+            self._save()
+            return False
+
+    def complete_run(self):
+        """流程正常结束，清除进度（保留重试队列）"""
+        with self._lock:
+            self.state["run"] = None
+            self._clear_rows()
+            self._save()
+
+    def discard_crawled(self):
+        """
+        数据库阶段失败时调用：保留数据库写入进度（和重试队列），丢弃已爬取的配置行，
+        下次运行重新爬取所有服务，不会把本次的旧配置行写入新的CSV和配置历史
+        """
+        with self._lock:
+            run = self.state.get("run")
+            if not run:
+                return
+            run["crawled"] = {}
+            self._clear_rows()
+            self._save()
+
+    def get_crawled(self, service_id) -> Optional[tuple]:
+        """
+        获取检查点中已爬取的服务结果
+
+        Returns:
+            tuple: (配置行列表, JSON文件路径)，没有记录时返回None
+        """
+        run = self.state.get("run")
+        if not run or str(service_id) not in run["crawled"]:
+            return None
+        try:
+            with open(self._rows_path(service_id), 'rb') as f:
+                rows = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except (OSError, ValueError, zlib.error):
+            return None
+        return rows, run["crawled"][str(service_id)]
+
+    def mark_crawled(self, service: Dict, rows: List[Dict], json_file: str):
+        """记录一个服务爬取成功"""
+        service_id = str(service.get('id'))
+        with self._lock:
+            run = self.state.get("run")
+            if run:
+                with open(self._rows_path(service_id), 'wb') as f:
+                    f.write(zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8')))
+                run["crawled"][service_id] = json_file
+            cleared = self._clear_failure(service_id, 'crawl')
+            if run or cleared:
+                self._save()
+
+    def is_db_written(self, service_id) -> bool:
+        """服务是否已在本次流程中写入数据库"""
+        run = self.state.get("run")
+        return bool(run) and str(service_id) in run["db_written"]
+
+    def has_db_writes(self) -> bool:
+        """本次流程是否已有服务写入数据库"""
+        run = self.state.get("run")
+        return bool(run) and bool(run["db_written"])
+
+    def mark_db_written(self, service: Dict):
+        """记录一个服务写入数据库成功"""
+        service_id = str(service.get('id'))
+        with self._lock:
+            run = self.state.get("run")
+            if run:
+                run["db_written"].append(service_id)
+            cleared = self._clear_failure(service_id, 'database')
+            if run or cleared:
+                self._save()
+
+    def _clear_failure(self, service_id: str, stage: str) -> bool:
+        entry = self.state["failed"].get(service_id)
+        if not entry or stage not in entry["stages"]:
+            return False
+        entry["stages"].remove(stage)
+        entry["attempts"].pop(stage, None)
+        if not entry["stages"]:
+            del self.state["failed"][service_id]
+            logger.info(f"服务 {entry['service'].get('name', 'Unknown')} 重试成功，已移出重试队列")
+        return True
+
+    def mark_failed(self, service: Dict, stage: str, scope: str, error: str):
+        """
+        将失败的服务加入重试队列
+
+        Args:
+            service: 服务信息
+            stage: 失败的阶段（crawl 或 database）
+            scope: 服务类别（cluster 或 global）
+            error: 错误信息
+        """
+        service_id = str(service.get('id'))
+        service_name = service.get('name', 'Unknown')
+        with self._lock:
+            entry = self.state["failed"].setdefault(
+                service_id, {"service": service, "scope": scope, "stages": [], "attempts": {}}
+            )
+            entry.update(service=service, error=error, failed_at=datetime.now().isoformat())
+            attempts = entry["attempts"][stage] = entry["attempts"].get(stage, 0) + 1
+            if stage not in entry["stages"]:
+                entry["stages"].append(stage)
+            if attempts >= self.max_attempts:
+                del self.state["failed"][service_id]
+                logger.error(f"服务 {service_name} {stage} 已连续失败 {attempts} 次，移出重试队列: {error}")
+            else:
+                logger.warning(f"服务 {service_name} {stage} 失败（第 {attempts} 次），已加入重试队列: {error}")
+            self._save()
+
+    def retry_queue(self) -> Dict[str, List[Dict]]:
+        """
+        获取重试队列中的服务
+
+        Returns:
+            Dict: {"cluster": 集群服务列表, "global": 全局服务列表}
+        """
+        with self._lock:
+            queue = {"cluster": [], "global": []}
+            for entry in self.state["failed"].values():
+                queue[entry["scope"]].append(entry["service"])
+            return queue
+
+
+class OutputRetentionManager:
+    """
+    输出目录保留管理
+
+    保留最近 keep_runs 次爬取的完整目录；更早的爬取只把CSV和摘要文件归档到按天压缩的
+    archive/tdh_configs_YYYYMMDD.zip 中，然后删除目录；超过 max_age_days 的归档被删除；
+    输出目录超过 max_disk_mb 时从最早的归档和爬取目录开始删除。写后缓冲队列等其他内容不受影响。
+    """
+
+    ARCHIVED_PREFIXES = ('tdh_configs_', 'crawl_summary_', 'profile_summary_')
+
+    def __init__(self, config_manager: ConfigManager):
+        retention_config = config_manager.get_retention_config()
+        self.output_dir = config_manager.get_output_config().get('output_dir', 'tdh_configs')
+        self.archive_dir = os.path.join(self.output_dir, 'archive')
+        self.keep_runs = retention_config.get('keep_runs', 50)
+        self.max_age_days = retention_config.get('max_age_days', 30)
+        self.max_disk_mb = retention_config.get('max_disk_mb', 0)
+        self.interval_minutes = retention_config.get('interval_minutes', 60)
+        self.protected_dirs = set()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台清理线程（重复调用无副作用）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="output-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台清理线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval_minutes * 60)
+
+    def _list_runs(self) -> List[str]:
+        """按时间顺序列出爬取目录（目录名中的时间戳即先后顺序）"""
+        if not os.path.isdir(self.output_dir):
+            return []
+        return sorted(
+            os.path.join(self.output_dir, name)
+            for name in os.listdir(self.output_dir)
+            if name.startswith('crawl_') and os.path.isdir(os.path.join(self.output_dir, name))
+        )
+
+    def _list_archives(self) -> List[str]:
+        """按日期顺序列出归档文件"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        return sorted(
+            os.path.join(self.archive_dir, name)
+            for name in os.listdir(self.archive_dir)
+            if name.startswith('tdh_configs_') and name.endswith('.zip')
+        )
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        执行一次归档和清理
+
+        Returns:
+            Dict: 归档的目录数、删除的归档数和删除的目录数
+        """
+        stats = {"runs_archived": 0, "archives_deleted": 0, "runs_deleted": 0}
+        try:
+            runs = [run for run in self._list_runs() if os.path.abspath(run) not in self.protected_dirs]
+            for run_dir in runs[:max(len(runs) - self.keep_runs, 0)]:
+                self._archive_run(run_dir)
+                stats["runs_archived"] += 1
+
+            if self.max_age_days:
+                cutoff = (datetime.now() - timedelta(days=self.max_age_days)).strftime("%Y%m%d")
+                for archive in self._list_archives():
+                    if os.path.basename(archive)[len('tdh_configs_'):-len('.zip')] < cutoff:
+                        os.remove(archive)
+                        stats["archives_deleted"] += 1
+
+            if self.max_disk_mb:
+                deleted_archives, deleted_runs = self._enforce_disk_budget()
+                stats["archives_deleted"] += deleted_archives
+                stats["runs_deleted"] += deleted_runs
+
+            if any(stats.values()):
+                logger.info(f"输出目录清理完成: {stats}")
+        except Exception as e:
+            logger.error(f"输出目录清理过程中发生错误: {str(e)}")
+        return stats
+
+    def _archive_run(self, run_dir: str):
+        """把一次爬取的CSV和摘要文件追加到当天的压缩归档中，然后删除该目录"""
+        run_name = os.path.basename(run_dir)
+        day = run_name[len('crawl_'):len('crawl_') + 8]
+        files = [
+            name for name in sorted(os.listdir(run_dir))
+            if name.startswith(self.ARCHIVED_PREFIXES) and name.endswith(('.csv', '.json'))
+        ]
+
+        if files:
+            if not os.path.exists(self.archive_dir):
+                os.makedirs(self.archive_dir)
+            archive_path = os.path.join(self.archive_dir, f"tdh_configs_{day}.zip")
+            with zipfile.ZipFile(archive_path, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+                existing = set(archive.namelist())
+                for name in files:
+                    # 上次归档中途退出时，已写入的文件不再重复写入
+                    arcname = f"{run_name}/{name}"
+                    if arcname not in existing:
+                        archive.write(os.path.join(run_dir, name), arcname)
+        shutil.rmtree(run_dir)
+
+    @staticmethod
+    def _path_size(path: str) -> int:
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _enforce_disk_budget(self) -> tuple:
+        """超出磁盘预算时先删除最早的归档，再删除最早的爬取目录（保留受保护的当前目录）"""
+        budget = self.max_disk_mb * 1024 * 1024
+        total = self._path_size(self.output_dir)
+        deleted_archives = deleted_runs = 0
+
+        for archive in self._list_archives():
+            if total <= budget:
+                break
+            total -= self._path_size(archive)
+            os.remove(archive)
+            deleted_archives += 1
+
+        for run_dir in self._list_runs():
+            if total <= budget:
+                break
+            if os.path.abspath(run_dir) in self.protected_dirs:
+                continue
+            total -= self._path_size(run_dir)
+            shutil.rmtree(run_dir)
+            deleted_runs += 1
+
+        if total > budget:
+            logger.warning(f"输出目录仍超出磁盘预算 {self.max_disk_mb} MB（当前 {total / 1024 / 1024:.1f} MB）")
+        return deleted_archives, deleted_runs
+
+
+class LeaderElection:
+    """
+    多实例主节点选举
+
+    多台主机同时运行定时任务时，通过MySQL的 GET_LOCK 在现有数据库中选出一个主节点执行爬取，
+    其余实例待命。锁与数据库连接绑定：持有锁期间由后台线程每 lease_seconds/3 秒心跳一次，
+    爬取和数据库更新耗时再长连接也不会因空闲被断开；主节点退出或宕机后心跳停止，
+    连接最迟在 lease_seconds 秒后被MySQL回收，锁随之释放，待命实例在下一次任务时接管。
+    """
+
+    def __init__(self, config_manager: ConfigManager, cluster_id: int):
+        coordination_config = config_manager.get_coordination_config()
+        self.lock_name = f"{coordination_config.get('lock_name', 'tdh_config_pull')}:{cluster_id}"[:64]
+        self.lease_seconds = coordination_config.get('lease_seconds', 180)
+        self.fail_open = coordination_config.get('fail_open', False)
+        self.db_manager = DatabaseManager(config_manager)
+        self.is_leader = False
+        # 连接在调度线程和心跳线程间共享，pymysql连接本身不是线程安全的
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._heartbeat_thread = None
+
+    def acquire(self) -> bool:
+        """
+        确认或尝试成为主节点（不阻塞）
+
+        Returns:
+            bool: 本实例是否应该执行任务
+        """
+        with self._lock:
+            if self.is_leader and self.heartbeat():
+                return True
+            acquired = self._acquire_lock()
+        if acquired and self.is_leader:
+            self._start_heartbeat()
+        return acquired
+
+    def _acquire_lock(self) -> bool:
+        """建立锁连接并尝试获取锁（调用方持有 self._lock）"""
+        if not self.db_manager.connect():
+            if self.fail_open:
+                logger.warning("主节点选举：数据库不可用，按 fail_open 配置继续执行任务")
+                return True
+            logger.warning("主节点选举：数据库不可用，跳过本次任务")
+            return False
+
+        try:
+            with self.db_manager.connection.cursor() as cursor:
+                # 连接空闲超过租约时间即被MySQL断开，宕机主节点的锁随之释放
+                cursor.execute("SET SESSION wait_timeout = %s", (int(self.lease_seconds),))
+                cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (self.lock_name,))
+                acquired = cursor.fetchone()['acquired'] == 1
+        except Exception as e:
+            logger.error(f"主节点选举失败: {str(e)}")
+            acquired = False
+
+        if acquired:
+            self.is_leader = True
+            logger.info(f"本实例成为主节点（锁: {self.lock_name}）")
+        else:
+            self._disconnect()
+            logger.info(f"其他实例持有主节点锁 {self.lock_name}，本实例待命")
+        return acquired
+
+    def heartbeat(self) -> bool:
+        """
+        主节点心跳：保持数据库连接并确认仍持有锁
+
+        Returns:
+            bool: 是否仍是主节点
+        """
+        with self._lock:
+            if not self.is_leader:
+                return False
+            try:
+                with self.db_manager.connection.cursor() as cursor:
+                    cursor.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID() AS held", (self.lock_name,))
+                    held = cursor.fetchone()['held'] == 1
+            except Exception as e:
+                logger.warning(f"主节点心跳失败: {str(e)}")
+                held = False
+
+            if not held:
+                logger.warning(f"本实例已失去主节点锁 {self.lock_name}")
+                self._disconnect()
+            return held
+
+    def _start_heartbeat(self):
+        """启动后台心跳线程（持有锁期间一直运行，失去锁或释放后退出）"""
+        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="leader-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        interval = max(self.lease_seconds / 3, 1)
+        while not self._stop_event.wait(interval):
+            if not self.heartbeat():
+                break
+
+    def release(self):
+        """停止心跳并释放主节点锁"""
+        self._stop_event.set()
+        if self._heartbeat_thread and self._heartbeat_thread is not threading.current_thread():
+            self._heartbeat_thread.join(timeout=10)
+        self._heartbeat_thread = None
+        with self._lock:
+            if not self.is_leader:
+                return
+            try:
+                with self.db_manager.connection.cursor() as cursor:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", (self.lock_name,))
+                logger.info(f"已释放主节点锁 {self.lock_name}")
+            except Exception as e:
+                logger.warning(f"释放主节点锁失败: {str(e)}")
+            self._disconnect()
+
+    def _disconnect(self):
+        self.is_leader = False
+        try:
+            self.db_manager.disconnect()
+        except Exception:
+            pass
+        self.db_manager.connection = None
+
+
+class TDHAutoLogin:
+    """TDH自动登录类"""
+    
+    # 默认只保留的配置字段：CSV、JSON备份、数据库和配置历史用到的全部字段
+    DEFAULT_CONFIG_FIELDS = [
+        'name', 'value', 'description', 'isSupportedMultiInstances',
+        'visibility', 'configFile', 'recommendedValue', 'values'
+    ]
+    
+    def __init__(self, config_manager: ConfigManager, session_output_dir: str = None):
+        self.config_manager = config_manager
+        
+        # 获取配置
+        self._load_settings()
+        
+        self.replay_archive = self._build_replay_archive()
+        self.session = self._build_session()
+        self.is_logged_in = False
+        
+        # 创建输出目录
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        
+        # 为每次爬取创建独立的时间戳文件夹（爬取工作进程复用主进程的文件夹）
+        self.session_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.session_output_dir = session_output_dir or os.path.join(self.output_dir, f"crawl_{self.session_timestamp}")
+        if not os.path.exists(self.session_output_dir):
+            os.makedirs(self.session_output_dir)
+        
+        # 初始化数据库管理器
+        self.db_manager = DatabaseManager(config_manager)
+        
+        # 按服务记录进度的检查点和重试队列（可选）
+        self.checkpoint = None
+        if config_manager.get_checkpoint_config().get('enabled', False):
+            self.checkpoint = CrawlCheckpoint(config_manager)
+        
+        # 初始化数据库写后缓冲队列（可选）
+        self.write_behind = None
+        if config_manager.get_write_behind_config().get('enabled', False):
+            self.write_behind = WriteBehindQueue(config_manager)
+        
+        # 监视模式的服务列表快照
+        self._watch_snapshot = None
+        
+        # 按接口统计的传输字节数
+        self._transfer_lock = threading.Lock()
+        self.transfer_stats = {}
+        
+        # 自适应限流（启用后替代固定的请求间隔）
+        self.rate_limiter = None
+        if config_manager.get_rate_limit_config().get('enabled', False) and self.replay_mode != 'replay':
+            self.rate_limiter = AdaptiveRateLimiter(config_manager)
+        
+        # 多实例主节点选举（只在定时任务中使用）
+        self.leader_election = self._build_leader_election()
+        
+        # 输出目录保留管理（后台线程在运行完整流程时才启动，爬取工作进程和只同步数据库时不启动）
+        self.retention_manager = self._build_retention_manager()
+    
+    def _build_retention_manager(self) -> Optional[OutputRetentionManager]:
+        """按 retention 配置创建输出目录保留管理（不启动后台线程）"""
+        if not self.config_manager.get_retention_config().get('enabled', False):
+            return None
+        retention_manager = OutputRetentionManager(self.config_manager)
+        retention_manager.protected_dirs.add(os.path.abspath(self.session_output_dir))
+        return retention_manager
+    
+    def _start_new_session_output_dir(self):
+        """为新的一次爬取创建独立的时间戳文件夹（当前文件夹为空时继续使用）"""
+        if not os.listdir(self.session_output_dir):
+            return
+        session_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        session_output_dir = os.path.join(self.output_dir, f"crawl_{session_timestamp}")
+        if session_output_dir == self.session_output_dir:
+            return
+        if not os.path.exists(session_output_dir):
+            os.makedirs(session_output_dir)
+        if self.retention_manager:
+            self.retention_manager.protected_dirs = {os.path.abspath(session_output_dir)}
+        self.session_timestamp = session_timestamp
+        self.session_output_dir = session_output_dir
+    
+    def _build_replay_archive(self) -> Optional[ReplayArchive]:
+        """按 replay 配置打开录制归档（录制时新建，回放时加载）"""
+        if self.replay_mode not in ('record', 'replay'):
+            return None
+        archive = ReplayArchive(self.replay_archive_path)
+        if self.replay_mode == 'record':
+            archive.open_for_recording()
+        else:
+            archive.load()
+        return archive
+    
+    def _build_leader_election(self) -> Optional[LeaderElection]:
+        """按 coordination 配置创建主节点选举"""
+        if not self.config_manager.get_coordination_config().get('enabled', False):
+            return None
+        return LeaderElection(self.config_manager, self.cluster_id)
+    
+    def should_run_scheduled_task(self) -> bool:
+        """多实例部署时只有主节点执行定时任务"""
+        if not self.leader_election:
+            return True
+        return self.leader_election.acquire()
+    
+    def _build_session(self) -> requests.Session:
+        """
+        创建HTTP会话，按 http 配置设置连接池大小、TLS会话恢复和可选的HTTP/2传输
+        
+        Returns:
+            requests.Session: HTTP会话
+        """
+        http_config = self.config_manager.get_http_config()
+        pool_maxsize = http_config.get('pool_maxsize', 10)
+        
+        session = requests.Session()
+        
+        if self.replay_archive and self.replay_mode == 'replay':
+            # 回放：所有请求由录制归档响应，不建立网络连接
+            adapter = ReplayAdapter(self.replay_archive)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            return session
+        
+        # 配置SSL适配器
+        adapter = SSLAdapter(
+            pool_connections=http_config.get('pool_connections', 10),
+            pool_maxsize=pool_maxsize,
+            pool_block=http_config.get('pool_block', False),
+            tls_session_resumption=http_config.get('tls_session_resumption', True)
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        
+        if http_config.get('http2', False):
+            try:
+                session.mount("https://", HTTP2Adapter(pool_maxsize=pool_maxsize))
+            except ImportError:
+                logger.warning('未安装httpx[http2]，继续使用HTTP/1.1（pip install "httpx[http2]"）')
+        
+        if self.replay_archive:
+            # 录制：包装实际的传输适配器（同一适配器只包装一次）
+            recorders = {}
+            for prefix, inner in list(session.adapters.items()):
+                if id(inner) not in recorders:
+                    recorders[id(inner)] = RecordingAdapter(inner, self.replay_archive)
+                session.mount(prefix, recorders[id(inner)])
+        
+        # 设置请求头
+        session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            # 压缩传输：urllib3能解码的编码（gzip、deflate，安装brotli/zstandard后还包括br/zstd）
+            'Accept-Encoding': ACCEPT_ENCODING if http_config.get('compression', True) else 'identity'
+        })
+        return session
+    
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """
+        获取各传输适配器的连接复用统计
+        
+        Returns:
+            Dict: {URL前缀: 统计信息}
+        """
+        stats = {}
+        seen = set()
+        for prefix, adapter in self.session.adapters.items():
+            if hasattr(adapter, 'connection_stats') and id(adapter) not in seen:
+                seen.add(id(adapter))
+                stats[prefix] = adapter.connection_stats()
+        return stats
+    
+    def _load_settings(self):
+        """从配置管理器读取标量配置参数（初始化和热加载时调用）"""
+        tdh_config = self.config_manager.get_tdh_config()
+        output_config = self.config_manager.get_output_config()
+        request_config = self.config_manager.get_request_config()
+        
+        self.base_url = tdh_config.get('base_url', 'https://localhost:8180')
+        self.username = tdh_config.get('username', 'admin')
+        self.password = tdh_config.get('password', 'admin')
+        self.cluster_id = tdh_config.get('cluster_id', 1)
+        
+        # 配置参数
+        self.output_dir = output_config.get('output_dir', 'tdh_configs')
+        self.save_config_file = output_config.get('save_config_file', True)
+        self.verbose_logging = output_config.get('verbose_logging', True)
+        self.timeout = request_config.get('timeout', 30)
+        self.delay = request_config.get('delay', 0.5)
+        self.max_retries = request_config.get('max_retries', 3)
+        self.stream_configs = request_config.get('stream_configs', False)
+        self.config_fields = request_config.get('config_fields', self.DEFAULT_CONFIG_FIELDS) or []
+        self.config_page_size = request_config.get('config_page_size', 0)
+        self.config_max_pages = request_config.get('config_max_pages', 1000)
+        self.crawl_workers = self.config_manager.get_crawl_config().get('workers', 1)
+        
+        replay_config = self.config_manager.get_replay_config()
+        self.replay_mode = replay_config.get('mode', 'off') or 'off'
+        self.replay_archive_path = replay_config.get('archive', 'tdh_replay.jsonl.gz')
+        if self.replay_mode == 'replay':
+            # 回放时全速运行
+            self.delay = 0
+        elif self.replay_mode == 'record' and self.crawl_workers > 1:
+            logger.warning("录制时不使用多进程爬取（crawl.workers 按1处理）")
+            self.crawl_workers = 1
+        
+        watch_config = self.config_manager.get_scheduler_config().get('watch', {}) or {}
+        self.watch_fields = watch_config.get('fields', ['version', 'health', 'state'])
+        
+        if self.stream_configs and ijson is None:
+            logger.warning("未安装ijson，配置列表将回退为整体解析（pip install ijson）")
+        
+        # 设置日志级别
+        if self.verbose_logging:
+            logging.getLogger().setLevel(logging.INFO)
+        else:
+            logging.getLogger().setLevel(logging.WARNING)
+    
+    def apply_config_changes(self, changed_sections: List[str]):
+        """
+        配置文件热加载后增量更新：只重建受影响的组件，
+        未变化的组件（HTTP会话、数据库连接、写入线程等）保持不变
+        
+        Args:
+            changed_sections: 发生变化的顶层配置段
+        """
+        old_login = (self.base_url, self.username, self.password)
+        old_cluster_id = self.cluster_id
+        old_output_dir = self.output_dir
+        self._load_settings()
+        
+        if (self.base_url, self.username, self.password) != old_login:
+            # 登录信息变化后需要重新登录，连接池保持不变
+            self.is_logged_in = False
+            self.session.cookies.clear()
+            self._watch_snapshot = None
+            logger.info("TDH登录信息已变化，下次请求前重新登录")
+        elif self.cluster_id != old_cluster_id:
+            self._watch_snapshot = None
+        
+        if self.output_dir != old_output_dir:
+            if not os.path.exists(self.output_dir):
+                os.makedirs(self.output_dir)
+            self.session_output_dir = os.path.join(self.output_dir, f"crawl_{self.session_timestamp}")
+            if not os.path.exists(self.session_output_dir):
+                os.makedirs(self.session_output_dir)
+            logger.info(f"输出目录已变化: {self.session_output_dir}")
+        
+        if 'database' in changed_sections or 'write_behind' in changed_sections:
+            if self.write_behind:
+                self.write_behind.stop()
+            self.db_manager = DatabaseManager(self.config_manager)
+            self.write_behind = None
+            if self.config_manager.get_write_behind_config().get('enabled', False):
+                self.write_behind = WriteBehindQueue(self.config_manager)
+            logger.info("数据库配置已变化，数据库管理器已重建")
+        
+        if 'http' in changed_sections:
+            # 重建连接池，登录信息不变时保留cookies
+            cookies = self.session.cookies
+            self.session.close()
+            self.session = self._build_session()
+            if self.is_logged_in:
+                self.session.cookies.update(cookies)
+            logger.info("HTTP连接配置已变化，HTTP会话已重建")
+        
+        if {'coordination', 'database', 'tdh'} & set(changed_sections):
+            if self.leader_election:
+                self.leader_election.release()
+            self.leader_election = self._build_leader_election()
+        
+        if {'checkpoint', 'output'} & set(changed_sections):
+            self.checkpoint = None
+            if self.config_manager.get_checkpoint_config().get('enabled', False):
+                self.checkpoint = CrawlCheckpoint(self.config_manager)
+        
+        if {'retention', 'output'} & set(changed_sections):
+            if self.retention_manager:
+                self.retention_manager.stop()
+            self.retention_manager = self._build_retention_manager()
+            if self.retention_manager:
+                self.retention_manager.start()
+        
+        if 'rate_limit' in changed_sections:
+            self.rate_limiter = None
+            if self.config_manager.get_rate_limit_config().get('enabled', False) and self.replay_mode != 'replay':
+                self.rate_limiter = AdaptiveRateLimiter(self.config_manager)
+            logger.info("限流配置已变化，限流器已重建")
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        发送API请求，启用自适应限流时按当前速率和并发数放行，
+        非流式响应的传输字节数计入 transfer_stats
+        
+        Args:
+            method: HTTP方法
+            url: 请求URL
+            **kwargs: 传给 requests.Session.request 的参数
+            
+        Returns:
+            requests.Response: 响应对象
+        """
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        start = time.monotonic()
+        response = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            if not kwargs.get('stream'):
+                self._record_transfer(response)
+            return response
+        finally:
+            if self.rate_limiter:
+                self.rate_limiter.release(
+                    time.monotonic() - start,
+                    response.status_code if response is not None else None,
+                    response.headers.get('Retry-After') if response is not None else None
+                )
+    
+    def _record_transfer(self, response: requests.Response, decoded_bytes: int = None):
+        """
+        记录一次响应的传输字节数（网络传输的原始字节数和解压后的字节数）
+        
+        Args:
+            response: 响应对象
+            decoded_bytes: 解压后的字节数（流式读取时由调用方统计，默认为响应内容长度）
+        """
+        wire_bytes = getattr(response.raw, 'wire_bytes', None)
+        if wire_bytes is None:
+            try:
+                wire_bytes = response.raw.tell()
+            except (AttributeError, ValueError):
+                wire_bytes = 0
+        if decoded_bytes is None:
+            decoded_bytes = len(response.content or b'')
+        
+        # 按接口路径归类，数字ID替换为占位符
+        path = re.sub(r'/\d+(?=/|$)', '/{id}', urlparse(response.url).path)
+        endpoint = f"{response.request.method} {path}"
+        encoding = response.headers.get('Content-Encoding', 'identity')
+        
+        with self._transfer_lock:
+            stats = self.transfer_stats.setdefault(
+                endpoint, {"requests": 0, "wire_bytes": 0, "decoded_bytes": 0, "encodings": {}}
+            )
+            stats["requests"] += 1
+            stats["wire_bytes"] += wire_bytes
+            stats["decoded_bytes"] += decoded_bytes
+            stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + 1
+    
+    def merge_transfer_stats(self, other_stats: Dict[str, Dict]):
+        """合并其他进程统计的传输字节数"""
+        with self._transfer_lock:
+            for endpoint, other in other_stats.items():
+                stats = self.transfer_stats.setdefault(
+                    endpoint, {"requests": 0, "wire_bytes": 0, "decoded_bytes": 0, "encodings": {}}
+                )
+                for key in ("requests", "wire_bytes", "decoded_bytes"):
+                    stats[key] += other[key]
+                for encoding, count in other["encodings"].items():
+                    stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + count
+    
+    def get_transfer_stats(self) -> Dict[str, Any]:
+        """
+        获取按接口统计的传输字节数
+        
+        Returns:
+            Dict: 各接口及合计的请求数、原始字节数、解压后字节数和压缩率
+        """
+        with self._transfer_lock:
+            endpoints = {endpoint: dict(stats, encodings=dict(stats["encodings"]))
+                         for endpoint, stats in self.transfer_stats.items()}
+        
+        total = {"requests": 0, "wire_bytes": 0, "decoded_bytes": 0}
+        for stats in endpoints.values():
+            stats["compression_ratio"] = round(stats["wire_bytes"] / stats["decoded_bytes"], 3) if stats["decoded_bytes"] else 0.0
+            for key in total:
+                total[key] += stats[key]
+        total["compression_ratio"] = round(total["wire_bytes"] / total["decoded_bytes"], 3) if total["decoded_bytes"] else 0.0
+        return {"endpoints": endpoints, "total": total}
+    
+    def reset_transfer_stats(self):
+        """清空传输字节数统计"""
+        with self._transfer_lock:
+            self.transfer_stats = {}
+    
+    def login(self, username: str = None, password: str = None) -> bool:
+        """
+        登录TDH系统
+        
+        Args:
+            username: 用户名（可选，默认使用配置文件中的用户名）
+            password: 密码（可选，默认使用配置文件中的密码）
+            
+        Returns:
+            bool: 登录是否成功
+        """
+        # 使用配置文件中的用户名和密码作为默认值
+        if username is None:
+            username = self.username
+        if password is None:
+            password = self.password
+            
+        try:
+            login_url = f"{self.base_url}/api/users/login"
+            
+            login_data = {
+                "userName": username,
+                "userPassword": password,
+                "captcha": "",
+                "twoStepCode": ""
+            }
             
             logger.info(f"正在登录用户: {username}")
-            response = self.session.post(
+            response = self._request(
+                'POST',
                 login_url,
                 json=login_data,
                 verify=False,
@@ -371,7 +2328,7 @@ class TDHAutoLogin:
                 logger.warning("未登录，无法获取endpoint")
                 return None
             
-            response = self.session.get(endpoint_url, verify=False, timeout=30)
+            response = self._request('GET', endpoint_url, verify=False, timeout=30)
             
             if response.status_code == 200:
                 logger.info("成功获取endpoint信息")
@@ -404,7 +2361,7 @@ class TDHAutoLogin:
                 logger.warning("未登录，无法获取服务列表")
                 return None
             
-            response = self.session.get(services_url, verify=False, timeout=self.timeout)
+            response = self._request('GET', services_url, verify=False, timeout=self.timeout)
             
             if response.status_code == 200:
                 services = response.json()
@@ -432,7 +2389,7 @@ class TDHAutoLogin:
                 logger.warning("未登录，无法获取全局服务列表")
                 return None
             
-            response = self.session.get(global_services_url, verify=False, timeout=30)
+            response = self._request('GET', global_services_url, verify=False, timeout=30)
             
             if response.status_code == 200:
                 services = response.json()
@@ -446,36 +2403,135 @@ class TDHAutoLogin:
             logger.error(f"获取全局服务列表过程中发生错误: {str(e)}")
             return None
     
-    def get_service_configs(self, service_id: str) -> Optional[List[Dict]]:
+    def get_service_configs(self, service_id: str) -> Optional[List[Dict]]:
+        """
+        获取服务配置（完整列表，用于写后缓冲队列等需要整批配置的场景）
+        
+        Args:
+            service_id: 服务ID
+            
+        Returns:
+            List[Dict]: 服务配置列表
+        """
+        try:
+            configs = self.iter_service_configs(service_id)
+            if configs is None:
+                return None
+            configs = list(configs)
+            logger.info(f"成功获取到服务 {service_id} 的 {len(configs)} 个配置")
+            return configs
+                
+        except Exception as e:
+            logger.error(f"获取服务配置过程中发生错误: {str(e)}")
+            return None
+    
+    def iter_service_configs(self, service_id: str) -> Optional[Iterator[Dict]]:
+        """
+        逐个获取服务配置
+        
+        根据请求配置可流式解析响应（需要ijson）、只保留指定字段并分页获取。
+        配置按页逐个产出，调用方边接收边处理，不保留原始响应和已处理的页面；
+        内存中只有当前一页（流式解析时只有当前一个配置）和调用方自己保留的结果。
+        
+        Args:
+            service_id: 服务ID
+            
+        Returns:
+            Iterator[Dict]: 按 config_fields 过滤后的配置，未登录或第一页请求失败返回None
+            （之后的页面请求失败时结束迭代，解析错误在迭代时抛出）
+        """
+        configs_url = f"{self.base_url}/api/services/{service_id}/configs?showPredefined=true&showCustom=false"
+        
+        if not self.is_logged_in:
+            logger.warning("未登录，无法获取服务配置")
+            return None
+        
+        if self.config_page_size > 0:
+            first_page = self._open_configs_page(f"{configs_url}&page=1&pageSize={self.config_page_size}")
+            if first_page is None:
+                return None
+            return self._iter_config_pages(configs_url, first_page)
+        return self._open_configs_page(configs_url)
+    
+    def _open_configs_page(self, configs_url: str) -> Optional[Iterator[Dict]]:
         """
-        获取服务配置
+        请求一页配置列表
         
         Args:
-            service_id: 服务ID
+            configs_url: 配置列表URL
             
         Returns:
-            List[Dict]: 服务配置列表
+            Iterator[Dict]: 逐个产出按 config_fields 过滤后的配置，状态码不是200时返回None
         """
+        stream = self.stream_configs and ijson is not None
+        response = self._request('GET', configs_url, verify=False, timeout=30, stream=stream)
+        if response.status_code != 200:
+            logger.error(f"获取服务配置失败，状态码: {response.status_code}")
+            response.close()
+            return None
+        return self._iter_configs_response(response, stream)
+    
+    def _iter_configs_response(self, response: requests.Response, stream: bool) -> Iterator[Dict]:
+        """解析一页配置列表并逐个产出过滤后的配置，结束（包括提前结束）时关闭响应"""
         try:
-            configs_url = f"{self.base_url}/api/services/{service_id}/configs?showPredefined=true&showCustom=false"
-            
-            if not self.is_logged_in:
-                logger.warning("未登录，无法获取服务配置")
-                return None
-            
-            response = self.session.get(configs_url, verify=False, timeout=30)
-            
-            if response.status_code == 200:
-                configs = response.json()
-                logger.info(f"成功获取到服务 {service_id} 的 {len(configs)} 个配置")
-                return configs
+            if stream:
+                # 逐个元素解析JSON数组，不在内存中保留完整响应
+                response.raw.decode_content = True
+                reader = _CountingReader(response.raw)
+                for config in ijson.items(reader, 'item', use_float=True):
+                    yield self._filter_config_fields(config)
+                self._record_transfer(response, decoded_bytes=reader.bytes_read)
             else:
-                logger.error(f"获取服务配置失败，状态码: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"获取服务配置过程中发生错误: {str(e)}")
-            return None
+                for config in response.json():
+                    yield self._filter_config_fields(config)
+        finally:
+            response.close()
+    
+    def _iter_config_pages(self, configs_url: str, page_configs: Iterator[Dict]) -> Iterator[Dict]:
+        """
+        依次产出各页的配置，一页处理完才请求下一页
+        
+        接口忽略分页参数（返回条数超过页大小或重复返回同一页）时，
+        只使用第一页的结果，避免死循环。之后的页面请求失败时保留已产出的配置。
+        
+        Args:
+            configs_url: 配置列表URL（不含分页参数）
+            page_configs: 第一页的配置
+        """
+        previous_first = None
+        page = 1
+        try:
+            while True:
+                first = None
+                count = 0
+                for config in page_configs:
+                    if count == 0:
+                        if config == previous_first:
+                            return
+                        first = config
+                    count += 1
+                    yield config
+                if count != self.config_page_size:
+                    return
+                if page >= self.config_max_pages:
+                    logger.warning(f"配置分页数超过上限 {self.config_max_pages}，结果可能不完整")
+                    return
+                page += 1
+                previous_first = first
+                page_configs = self._open_configs_page(
+                    f"{configs_url}&page={page}&pageSize={self.config_page_size}"
+                )
+                if page_configs is None:
+                    return
+        finally:
+            if page_configs is not None:
+                page_configs.close()
+    
+    def _filter_config_fields(self, config: Dict) -> Dict:
+        """只保留 config_fields 中指定的字段（为空时保留全部字段）"""
+        if not self.config_fields:
+            return config
+        return {field: config[field] for field in self.config_fields if field in config}
     
     def save_configs_to_csv(self, all_configs: List[Dict], filename: str = None) -> str:
         """
@@ -488,6 +2544,8 @@ class TDHAutoLogin:
         Returns:
             str: 保存的文件路径
         """
+        import csv
+        
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"tdh_configs_{timestamp}.csv"
@@ -597,12 +2655,14 @@ class TDHAutoLogin:
             logger.error(f"获取健康服务列表时发生错误: {str(e)}")
             return None
 
-    def crawl_healthy_services_configs(self, cluster_id: int = None) -> Dict[str, Any]:
+    def crawl_healthy_services_configs(self, cluster_id: int = None,
+                                       services: List[Dict] = None) -> Dict[str, Any]:
         """
         爬取健康状态服务的配置，主要输出为CSV格式
         
         Args:
             cluster_id: 集群ID（可选，默认使用配置文件中的集群ID）
+            services: 只爬取这些服务（可选，默认获取集群的全部服务）
             
         Returns:
             Dict: 爬取结果
@@ -618,63 +2678,44 @@ class TDHAutoLogin:
             "healthy_services_count": 0,
             "total_configs": 0,
             "csv_file": "",
-            "json_files": []
+            "json_files": [],
+            "failed_services": []
         }
         
         # 获取健康状态的服务
-        healthy_services = self.get_healthy_services(cluster_id)
+        if services is None:
+            healthy_services = self.get_healthy_services(cluster_id)
+        else:
+            healthy_services = [service for service in services if service.get('health') == 'HEALTHY']
         if not healthy_services:
             logger.warning("没有找到健康状态的服务")
             return result
         
         result["healthy_services_count"] = len(healthy_services)
-        all_configs = []
         
-        for service in healthy_services:
-            service_id = service.get('id')
-            service_name = service.get('name', 'Unknown')
-            service_type = service.get('type', 'Unknown')
-            service_version = service.get('version', 'Unknown')
-            
-            logger.info(f"正在处理健康服务: {service_name}")
-            
-            # 获取服务配置
-            configs = self.get_service_configs(service_id)
-            if configs:
-                result["total_configs"] += len(configs)
-                
-                # 为每个配置添加服务信息和时间戳
-                for config in configs:
-                    config_with_service = config.copy()
-                    config_with_service.update({
-                        "service_id": service_id,
-                        "service_name": service_name,
-                        "service_type": service_type,
-                        "service_version": service_version,
-                        "timestamp": datetime.now().isoformat(),
-                        "cluster_id": cluster_id,
-                        # 确保用户选中的配置字段被正确映射
-                        "config_name": config.get('name', ''),
-                        "config_value": config.get('value', ''),
-                        "config_description": config.get('description', ''),
-                        "config_isSupportedMultiInstances": config.get('isSupportedMultiInstances', 0) if config.get('isSupportedMultiInstances') is not None else 0,
-                        "config_visibility": config.get('visibility', ''),
-                        "config_configFile": config.get('configFile', ''),
-                        "config_recommendedValue": config.get('recommendedValue', ''),
-                        "config_values": str(config.get('values', '')) if config.get('values') else ''
-                    })
-                    all_configs.append(config_with_service)
+        if self.crawl_workers > 1 and len(healthy_services) > 1:
+            all_configs = self._crawl_services_in_workers(healthy_services, cluster_id, result)
+        elif self.rate_limiter and self.rate_limiter.max_concurrency > 1:
+            all_configs = self._crawl_services_concurrently(healthy_services, cluster_id, result)
+        else:
+            all_configs = []
+            for service in healthy_services:
+                service_rows, json_file, resumed = self._crawl_service_with_checkpoint(service, cluster_id)
+                if service_rows is None:
+                    result["failed_services"].append(service.get('name', 'Unknown'))
+                    service_rows = []
+                result["total_configs"] += len(service_rows)
+                all_configs.extend(service_rows)
+                if json_file:
+                    result["json_files"].append(json_file)
                 
-                # 保存单个服务的配置到JSON文件（备用）
-                if self.save_config_file:
-                    saved_file = self.save_service_configs_to_file(
-                        service_name, configs, service
-                    )
-                    if saved_file:
-                        result["json_files"].append(saved_file)
-            
-            # 添加延迟避免请求过快
-            time.sleep(self.delay)
+                # 添加延迟避免请求过快（自适应限流时由限流器控制速率）
+                if not self.rate_limiter and not resumed:
+                    time.sleep(self.delay)
+        
+        # 记录配置历史（只写入变化的配置）
+        if all_configs and self.config_manager.get_features_config().get('record_history', False):
+            result["history"] = self.record_config_history(all_configs, cluster_id, result["timestamp"])
         
         # 主要输出：保存所有配置到CSV文件
         if self.save_config_file and all_configs:
@@ -683,16 +2724,295 @@ class TDHAutoLogin:
                 result["csv_file"] = csv_file
                 logger.info(f"主要输出：所有配置已保存到CSV文件: {csv_file}")
         
+        # 可选：配置值规范化（带类型的列，并标记与推荐值不一致的配置）
+        if all_configs and self.config_manager.get_features_config().get('normalize_values', False):
+            result["normalized"] = self.normalize_config_values(all_configs)
+        
+        if self.rate_limiter:
+            result["rate_limiter"] = self.rate_limiter.snapshot()
+            logger.info(f"自适应限流状态: {result['rate_limiter']}")
+        
+        result["connection_stats"] = self.get_connection_stats()
+        logger.info(f"连接复用统计: {result['connection_stats']}")
+        result["transfer_stats"] = self.get_transfer_stats()
+        logger.info(f"传输字节数: {result['transfer_stats']['total']}")
+        
+        if result["failed_services"]:
+            logger.warning(f"{len(result['failed_services'])} 个服务爬取失败: {', '.join(result['failed_services'])}")
         logger.info(f"爬取完成！共处理 {len(healthy_services)} 个健康服务，获取 {result['total_configs']} 个配置")
         return result
     
-    def update_database_with_configs(self, cluster_id: int = None, clear_old_data: bool = None) -> Dict[str, Any]:
+    def normalize_config_values(self, all_configs: List[Dict]) -> Dict[str, Any]:
+        """
+        将爬取结果批量规范化为带类型的列，保存到会话输出目录（需要numpy）
+        
+        Args:
+            all_configs: 爬取得到的配置行
+            
+        Returns:
+            Dict: 规范化摘要，未安装numpy或失败时为空
+        """
+        try:
+            import normalize_configs
+        except ImportError:
+            logger.warning("未安装numpy，跳过配置值规范化（pip install numpy）")
+            return {}
+        
+        try:
+            summary = normalize_configs.normalize_crawl(
+                all_configs, self.session_output_dir, datetime.now().strftime("%Y%m%d_%H%M%S")
+            )
+            logger.info(f"配置值规范化完成！{summary['rows']} 行，{summary['differs_from_recommended']} 个配置与推荐值不一致，"
+                        f"耗时 {summary['normalize_seconds']} 秒: {summary['table_file']}")
+            return summary
+        except Exception as e:
+            logger.error(f"配置值规范化过程中发生错误: {str(e)}")
+            return {}
+    
+    def _crawl_service(self, service: Dict, cluster_id: int) -> tuple:
+        """
+        爬取单个服务的配置并展开为CSV行
+        
+        Args:
+            service: 服务信息
+            cluster_id: 集群ID
+            
+        Returns:
+            tuple: (配置行列表, JSON文件路径)，获取配置失败时配置行列表为None
+        """
+        service_id = service.get('id')
+        service_name = service.get('name', 'Unknown')
+        
+        logger.info(f"正在处理健康服务: {service_name}")
+        
+        # 获取服务配置，边接收边展开为配置行（只有保存JSON备份时才另外保留过滤后的配置）
+        configs = self.iter_service_configs(service_id)
+        if configs is None:
+            return None, ""
+        kept_configs = [] if self.save_config_file else None
+        rows = self._build_config_rows(service, configs, cluster_id, kept_configs)
+        logger.info(f"成功获取到服务 {service_id} 的 {len(rows)} 个配置")
+        if not rows:
+            return [], ""
+        
+        # 保存单个服务的配置到JSON文件（备用）
+        saved_file = ""
+        if self.save_config_file:
+            saved_file = self.save_service_configs_to_file(service_name, kept_configs, service)
+        return rows, saved_file
+    
+    def _crawl_service_with_checkpoint(self, service: Dict, cluster_id: int) -> tuple:
+        """
+        爬取单个服务并记录检查点：检查点中已有的服务直接使用保存的结果，
+        失败（包括异常）只影响该服务，并将其加入重试队列
+        
+        Args:
+            service: 服务信息
+            cluster_id: 集群ID
+            
+        Returns:
+            tuple: (配置行列表（失败时为None）, JSON文件路径, 是否来自检查点)
+        """
+        if self.checkpoint:
+            crawled = self.checkpoint.get_crawled(service.get('id'))
+            if crawled is not None:
+                return crawled[0], crawled[1], True
+        
+        try:
+            rows, json_file = self._crawl_service(service, cluster_id)
+            error = "获取配置失败"
+        except Exception as e:
+            logger.error(f"爬取服务 {service.get('name', 'Unknown')} 时发生错误: {str(e)}")
+            rows, json_file, error = None, "", str(e)
+        self._record_crawl_result(service, rows, json_file, error)
+        return rows, json_file, False
+    
+    def _record_crawl_result(self, service: Dict, rows: Optional[List[Dict]], json_file: str, error: str):
+        """将单个服务的爬取结果记录到检查点（失败时加入重试队列）"""
+        if not self.checkpoint:
+            return
+        if rows is None:
+            self.checkpoint.mark_failed(service, 'crawl', 'cluster', error)
+        else:
+            self.checkpoint.mark_crawled(service, rows, json_file)
+    
+    def _build_config_rows(self, service: Dict, configs: Iterator[Dict], cluster_id: int,
+                           kept_configs: List[Dict] = None) -> List[Dict]:
+        """
+        为每个配置添加服务信息和时间戳
+        
+        Args:
+            service: 服务信息
+            configs: 服务配置（列表或逐个产出配置的迭代器）
+            cluster_id: 集群ID
+            kept_configs: 传入列表时同时收集原始配置（用于JSON备份）
+            
+        Returns:
+            List[Dict]: 配置行列表
+        """
+        rows = []
+        for config in configs:
+            if kept_configs is not None:
+                kept_configs.append(config)
+            config_with_service = config.copy()
+            config_with_service.update({
+                "service_id": service.get('id'),
+                "service_name": service.get('name', 'Unknown'),
+                "service_type": service.get('type', 'Unknown'),
+                "service_version": service.get('version', 'Unknown'),
+                "timestamp": datetime.now().isoformat(),
+                "cluster_id": cluster_id,
+                # 确保用户选中的配置字段被正确映射
+                "config_name": config.get('name', ''),
+                "config_value": config.get('value', ''),
+                "config_description": config.get('description', ''),
+                "config_isSupportedMultiInstances": config.get('isSupportedMultiInstances', 0) if config.get('isSupportedMultiInstances') is not None else 0,
+                "config_visibility": config.get('visibility', ''),
+                "config_configFile": config.get('configFile', ''),
+                "config_recommendedValue": config.get('recommendedValue', ''),
+                "config_values": str(config.get('values', '')) if config.get('values') else ''
+            })
+            rows.append(config_with_service)
+        return rows
+    
+    def _crawl_services_concurrently(self, services: List[Dict], cluster_id: int,
+                                     result: Dict[str, Any]) -> List[Dict]:
+        """
+        在线程池中并发爬取服务，实际并发数由自适应限流器控制
+        
+        Args:
+            services: 健康服务列表
+            cluster_id: 集群ID
+            result: 爬取结果（原地累加计数）
+            
+        Returns:
+            List[Dict]: 所有配置行（按原服务顺序）
+        """
+        all_configs = []
+        with ThreadPoolExecutor(max_workers=self.rate_limiter.max_concurrency) as executor:
+            futures = [executor.submit(self._crawl_service_with_checkpoint, service, cluster_id) for service in services]
+            for service, future in zip(services, futures):
+                service_rows, json_file, _ = future.result()
+                if service_rows is None:
+                    result["failed_services"].append(service.get('name', 'Unknown'))
+                    service_rows = []
+                result["total_configs"] += len(service_rows)
+                all_configs.extend(service_rows)
+                if json_file:
+                    result["json_files"].append(json_file)
+        return all_configs
+    
+    def _crawl_services_in_workers(self, services: List[Dict], cluster_id: int,
+                                   result: Dict[str, Any]) -> List[Dict]:
+        """
+        将服务分片到多个工作进程中爬取和后处理
+        
+        每个工作进程使用自己的HTTP会话（复用主进程的登录cookies），
+        返回压缩后的批次，主进程按原服务顺序合并。
+        
+        Args:
+            services: 健康服务列表
+            cluster_id: 集群ID
+            result: 爬取结果（原地累加计数）
+            
+        Returns:
+            List[Dict]: 所有配置行
+        """
+        cookies = requests.utils.dict_from_cookiejar(self.session.cookies)
+        batches = [None] * len(services)
+        
+        # 检查点中已爬取的服务不再分配给工作进程
+        indexed_services = []
+        for index, service in enumerate(services):
+            crawled = self.checkpoint.get_crawled(service.get('id')) if self.checkpoint else None
+            if crawled is not None:
+                batches[index] = crawled
+            else:
+                indexed_services.append((index, service))
+        
+        if indexed_services:
+            workers = min(self.crawl_workers, len(indexed_services))
+            logger.info(f"使用 {workers} 个工作进程爬取 {len(indexed_services)} 个健康服务")
+            shards = [indexed_services[i::workers] for i in range(workers)]
+            
+            # 用spawn启动工作进程：fork时输出保留、主节点心跳和写后缓冲线程可能正持有锁（包括日志处理器的锁），
+            # 子进程记录日志时会死锁；工作进程需要的状态都通过参数传入
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [
+                    executor.submit(_crawl_services_shard, self.config_manager, cookies,
+                                    self.session_output_dir, cluster_id, shard)
+                    for shard in shards
+                ]
+                for shard, future in zip(shards, futures):
+                    try:
+                        shard_batches, transfer_stats = future.result()
+                    except Exception as e:
+                        # 工作进程异常退出（如BrokenProcessPool）时只影响该分片的服务
+                        logger.error(f"爬取工作进程失败，{len(shard)} 个服务未完成: {str(e)}")
+                        for index, service in shard:
+                            self._record_crawl_result(service, None, "", str(e))
+                            batches[index] = (None, "")
+                        continue
+                    for index, payload, json_file, error in shard_batches:
+                        rows = json.loads(zlib.decompress(payload).decode('utf-8'))
+                        self._record_crawl_result(services[index], rows, json_file, error)
+                        batches[index] = (rows, json_file)
+                    self.merge_transfer_stats(transfer_stats)
+        
+        all_configs = []
+        for service, (rows, json_file) in zip(services, batches):
+            if rows is None:
+                result["failed_services"].append(service.get('name', 'Unknown'))
+                continue
+            result["total_configs"] += len(rows)
+            all_configs.extend(rows)
+            if json_file:
+                result["json_files"].append(json_file)
+        return all_configs
+    
+    def record_config_history(self, all_configs: List[Dict], cluster_id: int, timestamp: str) -> Dict[str, Any]:
+        """
+        将爬取结果写入配置历史表
+        
+        历史记录基于与当前有效值的比较，数据库暂时不可用时本次跳过，
+        下次爬取会补上期间的变化（变化时间以下次爬取时间为准）。
+        
+        Args:
+            all_configs: 爬取得到的配置行
+            cluster_id: 集群ID
+            timestamp: 爬取时间（ISO格式）
+            
+        Returns:
+            Dict: 历史记录结果
+        """
+        history_db = DatabaseManager(self.config_manager)
+        if not history_db.connect():
+            logger.error("数据库连接失败，跳过本次配置历史记录")
+            return {"success": False, "error": "数据库连接失败"}
+        
+        try:
+            observed_at = datetime.fromisoformat(timestamp).replace(microsecond=0)
+            stats = history_db.record_config_history(cluster_id, all_configs, observed_at)
+            logger.info(f"配置历史记录完成！新增: {stats['added']}, 变化: {stats['changed']}, "
+                        f"删除: {stats['removed']}, 未变化: {stats['unchanged']}")
+            return dict(stats, success=True)
+        except Exception as e:
+            logger.error(f"记录配置历史过程中发生错误: {str(e)}")
+            return {"success": False, "error": str(e)}
+        finally:
+            history_db.disconnect()
+    
+    def update_database_with_configs(self, cluster_id: int = None, clear_old_data: bool = None,
+                                     services: List[Dict] = None,
+                                     global_services: List[Dict] = None) -> Dict[str, Any]:
         """
         将配置更新到数据库（实现与Java项目相同的功能）
         
         Args:
             cluster_id: 集群ID（可选，默认使用配置文件中的集群ID）
             clear_old_data: 是否清空旧数据（可选，默认使用配置文件中的设置）
+            services: 只更新这些集群服务（可选，默认获取集群的全部服务）
+            global_services: 只更新这些全局服务（可选，默认根据配置获取全部全局服务）
             
         Returns:
             Dict: 更新结果
@@ -704,9 +3024,23 @@ class TDHAutoLogin:
             
         logger.info("开始更新数据库配置...")
         
+        if services is None:
+            services = self.get_services(cluster_id)
+        if global_services is None and self.config_manager.get_features_config().get('get_global_services', True):
+            global_services = self.get_global_services()
+        
+        if clear_old_data and self.checkpoint and self.checkpoint.has_db_writes():
+            # 从检查点恢复时已写入的服务不能被清空
+            logger.info("从检查点恢复，本次不清空旧数据")
+            clear_old_data = False
+        
+        if self.write_behind:
+            return self._queue_database_update(cluster_id, clear_old_data, services, global_services)
+        
         # 连接数据库
         if not self.db_manager.connect():
             logger.error("数据库连接失败，无法更新配置")
+            self._queue_unwritten_services(services, global_services, "数据库连接失败")
             return {"success": False, "error": "数据库连接失败"}
         
         try:
@@ -715,6 +3049,7 @@ class TDHAutoLogin:
                 "cluster_id": cluster_id,
                 "services_updated": 0,
                 "configs_updated": 0,
+                "failed_services": [],
                 "success": True
             }
             
@@ -723,69 +3058,166 @@ class TDHAutoLogin:
                 self.db_manager.clear_old_data()
             
             # 处理集群服务
-            services = self.get_services(cluster_id)
             if services:
-                for service in services:
-                    if service.get('health') != 'HEALTHY':
-                        continue
-                    
-                    # 保存服务信息
-                    service_id = self.db_manager.save_service(
-                        service.get('version', ''),
-                        service.get('type', '')
-                    )
-                    
-                    if service_id:
-                        result["services_updated"] += 1
-                        
-                        # 获取并保存配置
-                        configs = self.get_service_configs(service.get('id'))
-                        if configs:
-                            for config in configs:
-                                if self.db_manager.save_pull_config(service_id, config):
-                                    result["configs_updated"] += 1
-                        
-                        logger.info(f"服务 {service.get('name', 'Unknown')} 配置更新完成")
+                self._save_services_to_database(services, result, "服务", "cluster")
             
             # 处理全局服务（根据配置决定）
-            if self.config_manager.get_features_config().get('get_global_services', True):
-                global_services = self.get_global_services()
-                if global_services:
-                    for service in global_services:
-                        if service.get('health') != 'HEALTHY':
-                            continue
-                        
-                        # 保存服务信息
-                        service_id = self.db_manager.save_service(
-                            service.get('version', ''),
-                            service.get('type', '')
-                        )
-                        
-                        if service_id:
-                            result["services_updated"] += 1
-                            
-                            # 获取并保存配置
-                            configs = self.get_service_configs(service.get('id'))
-                            if configs:
-                                for config in configs:
-                                    if self.db_manager.save_pull_config(service_id, config):
-                                        result["configs_updated"] += 1
-                            
-                            logger.info(f"全局服务 {service.get('name', 'Unknown')} 配置更新完成")
+            if global_services:
+                self._save_services_to_database(global_services, result, "全局服务", "global")
             
             logger.info(f"数据库更新完成！服务: {result['services_updated']}, 配置: {result['configs_updated']}")
             return result
             
         except Exception as e:
             logger.error(f"数据库更新过程中发生错误: {str(e)}")
+            self._queue_unwritten_services(services, global_services, str(e))
             return {"success": False, "error": str(e)}
         
         finally:
             # 断开数据库连接
             self.db_manager.disconnect()
     
+    def _queue_unwritten_services(self, services: Optional[List[Dict]], global_services: Optional[List[Dict]],
+                                  error: str):
+        """数据库更新整体失败时，将本次流程中尚未写入的健康服务加入重试队列"""
+        if not self.checkpoint:
+            return
+        scoped_services = [(service, 'cluster') for service in services or []]
+        scoped_services += [(service, 'global') for service in global_services or []]
+        for service, scope in scoped_services:
+            if service.get('health') == 'HEALTHY' and not self.checkpoint.is_db_written(service.get('id')):
+                self.checkpoint.mark_failed(service, 'database', scope, error)
+    
+    def _save_services_to_database(self, services: List[Dict], result: Dict[str, Any], label: str,
+                                   scope: str):
+        """
+        将健康服务及其配置直接写入数据库
+        
+        单个服务失败（包括异常）不影响其他服务，启用检查点时加入重试队列；
+        检查点中本次流程已写入的服务被跳过。
+        
+        Args:
+            services: 服务列表
+            result: 更新结果（原地累加计数）
+            label: 日志中的服务类别名称
+            scope: 服务类别（cluster 或 global），用于重试队列
+        """
+        for service in services:
+            if service.get('health') != 'HEALTHY':
+                continue
+            if self.checkpoint and self.checkpoint.is_db_written(service.get('id')):
+                continue
+            
+            try:
+                error = self._save_service_to_database(service, result)
+            except Exception as e:
+                error = str(e)
+            
+            if error:
+                logger.error(f"{label} {service.get('name', 'Unknown')} 配置更新失败: {error}")
+                result["failed_services"].append(service.get('name', 'Unknown'))
+                if self.checkpoint:
+                    self.checkpoint.mark_failed(service, 'database', scope, error)
+            else:
+                logger.info(f"{label} {service.get('name', 'Unknown')} 配置更新完成")
+                if self.checkpoint:
+                    self.checkpoint.mark_db_written(service)
+    
+    def _save_service_to_database(self, service: Dict, result: Dict[str, Any]) -> Optional[str]:
+        """
+        将单个服务及其配置写入数据库
+        
+        Returns:
+            str: 错误信息，成功或服务已存在（跳过）时返回None
+        """
+        # 保存服务信息（服务已存在时返回None，与原流程一样跳过该服务；其他错误抛出）
+        service_id = self.db_manager.save_service(
+            service.get('version', ''),
+            service.get('type', ''),
+            raise_errors=True
+        )
+        if not service_id:
+            return None
+        result["services_updated"] += 1
+        
+        # 逐个获取并保存配置
+        configs = self.iter_service_configs(service.get('id'))
+        if configs is None:
+            return "获取配置失败"
+        
+        failed_configs = 0
+        for config in configs:
+            if self.db_manager.save_pull_config(service_id, config):
+                result["configs_updated"] += 1
+            else:
+                failed_configs += 1
+        if failed_configs:
+            return f"{failed_configs} 个配置保存失败"
+        return None
+    
+    def _queue_database_update(self, cluster_id: int, clear_old_data: bool, services: Optional[List[Dict]],
+                               global_services: Optional[List[Dict]]) -> Dict[str, Any]:
+        """
+        写后缓冲模式：拉取配置后写入本地队列，由后台线程写入数据库
+        
+        Args:
+            cluster_id: 集群ID
+            clear_old_data: 是否清空旧数据
+            services: 集群服务列表
+            global_services: 全局服务列表
+            
+        Returns:
+            Dict: 入队结果
+        """
+        result = {
+            "timestamp": datetime.now().isoformat(),
+            "cluster_id": cluster_id,
+            "write_behind": True,
+            "batches_queued": 0,
+            "configs_queued": 0,
+            "failed_services": [],
+            "success": True
+        }
+        
+        try:
+            self.write_behind.start()
+            
+            if clear_old_data:
+                self.write_behind.enqueue_clear()
+            
+            scoped_services = [(service, 'cluster') for service in services or []]
+            scoped_services += [(service, 'global') for service in global_services or []]
+            for service, scope in scoped_services:
+                if service.get('health') != 'HEALTHY':
+                    continue
+                if self.checkpoint and self.checkpoint.is_db_written(service.get('id')):
+                    continue
+                configs = self.get_service_configs(service.get('id'))
+                if configs is None:
+                    result["failed_services"].append(service.get('name', 'Unknown'))
+                    if self.checkpoint:
+                        self.checkpoint.mark_failed(service, 'database', scope, "获取配置失败")
+                    continue
+                # 批次落盘后即视为已写入（由写入线程保证最终写入数据库）
+                self.write_behind.enqueue_service(service, configs)
+                if self.checkpoint:
+                    self.checkpoint.mark_db_written(service)
+                result["batches_queued"] += 1
+                result["configs_queued"] += len(configs)
+            
+            result["pending_batches"] = self.write_behind.pending_count()
+            logger.info(f"配置已写入写后缓冲队列！批次: {result['batches_queued']}, 配置: {result['configs_queued']}, "
+                        f"待写入: {result['pending_batches']}")
+            return result
+            
+        except Exception as e:
+            logger.error(f"写入写后缓冲队列过程中发生错误: {str(e)}")
+            self._queue_unwritten_services(services, global_services, str(e))
+            return {"success": False, "error": str(e)}
+    
     def run_full_process(self, username: str = None, password: str = None, 
-                        update_database: bool = None, save_config_file: bool = None) -> None:
+                        update_database: bool = None, save_config_file: bool = None,
+                        profile: bool = None) -> None:
         """
         运行完整的处理流程，主要输出为CSV格式，并可选择更新数据库
         
@@ -794,33 +3226,66 @@ class TDHAutoLogin:
             password: 密码（可选，默认使用配置文件中的密码）
             update_database: 是否更新数据库（可选，默认使用配置文件中的设置）
             save_config_file: 是否保存配置文件（可选，默认使用配置文件中的设置）
+            profile: 是否分阶段记录性能分析数据（可选，默认使用配置文件中的设置）
         """
         # 使用配置文件中的默认值
         if update_database is None:
             update_database = self.config_manager.get_features_config().get('update_database', True)
         if save_config_file is None:
             save_config_file = self.config_manager.get_output_config().get('save_config_file', True)
+        if profile is None:
+            profile = self.config_manager.get_output_config().get('profile', False)
+        profiler = StageProfiler(self.session_output_dir, enabled=profile)
+        self.reset_transfer_stats()
+        if self.retention_manager:
+            self.retention_manager.start()
             
         logger.info("开始TDH自动登录和处理流程")
         
         # 1. 登录
-        if not self.login(username, password):
+        with profiler.stage("login"):
+            logged_in = self.login(username, password)
+        if not logged_in:
             logger.error("登录失败，退出流程")
+            profiler.save_summary()
             return
         
+        # 按服务记录进度，上次流程中途退出时从检查点继续
+        if self.checkpoint:
+            self.checkpoint.begin_run(self.cluster_id)
+        
         # 2. 爬取健康状态服务的配置（主要输出为CSV）
         logger.info("开始爬取健康状态服务的配置...")
-        crawl_result = self.crawl_healthy_services_configs()
+        with profiler.stage("crawl"):
+            crawl_result = self.crawl_healthy_services_configs()
         
         # 3. 更新数据库（可选）
         if update_database:
             logger.info("开始更新数据库配置...")
-            db_result = self.update_database_with_configs()
-            if db_result.get("success"):
+            with profiler.stage("database"):
+                db_result = self.update_database_with_configs()
+            if db_result.get("success") and db_result.get("write_behind"):
+                logger.info(f"数据库更新已入队！批次: {db_result.get('batches_queued', 0)}, 配置: {db_result.get('configs_queued', 0)}")
+            elif db_result.get("success"):
                 logger.info(f"数据库更新成功！服务: {db_result.get('services_updated', 0)}, 配置: {db_result.get('configs_updated', 0)}")
             else:
                 logger.error(f"数据库更新失败: {db_result.get('error', '未知错误')}")
         
+        # 数据库更新整体失败时只保留数据库写入进度（未写入的服务已加入重试队列），
+        # 爬取结果不复用，下次运行重新爬取
+        if self.checkpoint:
+            if not update_database or db_result.get("success"):
+                self.checkpoint.complete_run()
+            else:
+                self.checkpoint.discard_crawled()
+        
+        profile_file = profiler.save_summary()
+        if profile_file:
+            crawl_result["profile_summary"] = profile_file
+        
+        # 传输字节数包括登录和数据库更新阶段的请求
+        crawl_result["transfer_stats"] = self.get_transfer_stats()
+        
         # 保存爬取结果摘要
         if save_config_file:
             result_file = os.path.join(self.session_output_dir, f"crawl_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
@@ -830,6 +3295,127 @@ class TDHAutoLogin:
         
         logger.info("TDH自动登录和处理流程完成")
 
+    def run_watch_tick(self) -> Dict[str, Any]:
+        """
+        监视模式的一次轮询：只获取服务列表，与上次列表比较，
+        仅为新增或版本、健康状态变化的服务重新爬取配置并更新数据库
+        
+        Returns:
+            Dict: 本次轮询结果
+        """
+        result = {
+            "timestamp": datetime.now().isoformat(),
+            "changed_services": 0,
+            "total_configs": 0
+        }
+        
+        if not self.should_run_scheduled_task():
+            return result
+        
+        listing = self._fetch_service_listing()
+        if listing is None:
+            logger.error("监视模式：获取服务列表失败，跳过本次轮询")
+            return result
+        
+        changed = self._diff_service_listing(listing)
+        if changed is None:
+            logger.info(f"监视模式：已记录 {sum(len(v) for v in listing.values())} 个服务的基线状态")
+        
+        # 重试队列中的服务在本次轮询开始时一并重试
+        retry_queue = self.checkpoint.retry_queue() if self.checkpoint else {"cluster": [], "global": []}
+        result["retried_services"] = len(retry_queue["cluster"]) + len(retry_queue["global"])
+        if changed is None:
+            if not result["retried_services"]:
+                return result
+            changed = {"cluster": [], "global": []}
+        for scope, services in retry_queue.items():
+            changed_ids = {service.get('id') for service in changed[scope]}
+            changed[scope].extend(service for service in services if service.get('id') not in changed_ids)
+        
+        result["changed_services"] = len(changed["cluster"]) + len(changed["global"])
+        if not result["changed_services"]:
+            logger.info("监视模式：服务状态无变化")
+            return result
+        
+        logger.info(f"监视模式：{result['changed_services']} 个服务新增或状态变化，重新获取配置")
+        if changed["cluster"]:
+            crawl_result = self.crawl_healthy_services_configs(services=changed["cluster"])
+            result["total_configs"] = crawl_result["total_configs"]
+            result["csv_file"] = crawl_result["csv_file"]
+        
+        if self.config_manager.get_features_config().get('update_database', True):
+            db_result = self.update_database_with_configs(
+                clear_old_data=False,
+                services=changed["cluster"],
+                global_services=changed["global"]
+            )
+            result["database"] = db_result
+        return result
+    
+    def _fetch_service_listing(self) -> Optional[Dict[str, List[Dict]]]:
+        """
+        获取集群服务和全局服务列表，会话失效时重新登录一次
+        
+        Returns:
+            Dict: {"cluster": 集群服务列表, "global": 全局服务列表}
+        """
+        if not self.is_logged_in and not self.login():
+            return None
+        
+        services = self.get_services()
+        if services is None:
+            # 会话可能已过期，重新登录后重试
+            if not self.login():
+                return None
+            services = self.get_services()
+            if services is None:
+                return None
+        
+        global_services = []
+        if self.config_manager.get_features_config().get('get_global_services', True):
+            global_services = self.get_global_services() or []
+        return {"cluster": services, "global": global_services}
+    
+    def _diff_service_listing(self, listing: Dict[str, List[Dict]]) -> Optional[Dict[str, List[Dict]]]:
+        """
+        比较服务列表与上次轮询的快照，并更新快照
+        
+        Args:
+            listing: 本次获取的服务列表
+            
+        Returns:
+            Dict: 新增或状态变化的服务，首次轮询（无快照）时返回None
+        """
+        previous = self._watch_snapshot
+        current = {}
+        changed = {"cluster": [], "global": []}
+        for scope, services in listing.items():
+            for service in services:
+                key = (scope, service.get('id'))
+                fingerprint = tuple(service.get(field) for field in self.watch_fields)
+                current[key] = fingerprint
+                if previous is not None and previous.get(key) != fingerprint:
+                    changed[scope].append(service)
+        
+        if previous is not None:
+            removed = [key for key in previous if key not in current]
+            if removed:
+                logger.info(f"监视模式：{len(removed)} 个服务已移除")
+        
+        self._watch_snapshot = current
+        return changed if previous is not None else None
+    
+    def shutdown(self):
+        """释放后台资源：等待写后缓冲队列写入数据库后停止写入线程"""
+        if self.write_behind:
+            self.write_behind.stop()
+        if self.leader_election:
+            self.leader_election.release()
+        if self.retention_manager:
+            self.retention_manager.stop()
+        if self.replay_archive:
+            self.replay_archive.close()
+    
     def get_session_output_dir(self) -> str:
         """
         获取当前会话的输出目录
@@ -850,54 +3436,157 @@ class TDHAutoLogin:
             update_database: 是否更新数据库（可选，默认使用配置文件中的设置）
             save_config_file: 是否保存配置文件（可选，默认使用配置文件中的设置）
         """
+        if not self.should_run_scheduled_task():
+            return
         logger.info("执行定时任务...")
+        self._start_new_session_output_dir()
+        
+        # 监视模式：全量爬取开始前获取的服务列表作为轮询基线，
+        # 全量爬取期间及之后发生的变化在下一次轮询时即可发现，不必等到下一次全量爬取
+        watch_config = self.config_manager.get_scheduler_config().get('watch', {}) or {}
+        listing = self._fetch_service_listing() if watch_config.get('enabled', False) else None
+        
         self.run_full_process(username, password, update_database, save_config_file)
+        
+        if listing is not None:
+            self._watch_snapshot = None
+            self._diff_service_listing(listing)
+            logger.info(f"监视模式：已以全量爬取时的服务列表记录 {sum(len(v) for v in listing.values())} 个服务的基线状态")
+
+
+def _crawl_services_shard(config_manager: ConfigManager, cookies: Dict, session_output_dir: str,
+                         cluster_id: int, shard: List[tuple]) -> tuple:
+    """
+    爬取工作进程入口：爬取一个服务分片并返回压缩后的配置行
+    
+    Args:
+        config_manager: 配置管理器
+        cookies: 主进程登录后的cookies
+        session_output_dir: 主进程的会话输出目录
+        cluster_id: 集群ID
+        shard: (服务序号, 服务信息) 列表
+        
+    Returns:
+        tuple: ((服务序号, zlib压缩的JSON配置行（失败时为null）, JSON文件路径, 错误信息) 列表, 传输字节数统计)
+    """
+    # 工作进程只负责爬取，数据库写入和输出目录清理由主进程处理
+    config_manager.config.pop('write_behind', None)
+    config_manager.config.pop('checkpoint', None)
+    config_manager.config.pop('retention', None)
+    tdh = TDHAutoLogin(config_manager, session_output_dir=session_output_dir)
+    tdh.session.cookies.update(cookies)
+    tdh.is_logged_in = True
+    
+    batches = []
+    for index, service in shard:
+        try:
+            rows, json_file = tdh._crawl_service(service, cluster_id)
+            error = "获取配置失败"
+        except Exception as e:
+            logger.error(f"爬取服务 {service.get('name', 'Unknown')} 时发生错误: {str(e)}")
+            rows, json_file, error = None, "", str(e)
+        payload = zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+        batches.append((index, payload, json_file, error))
+        if not tdh.rate_limiter:
+            time.sleep(tdh.delay)
+    return batches, tdh.transfer_stats
+
+
+def _schedule_jobs(schedule, tdh: TDHAutoLogin, scheduler_config: Dict) -> int:
+    """
+    注册定时任务
+    
+    Args:
+        schedule: schedule模块
+        tdh: TDH自动登录实例
+        scheduler_config: 定时任务配置
+        
+    Returns:
+        int: 调度循环的检查间隔（秒）
+    """
+    interval_minutes = scheduler_config.get('interval_minutes', 1)
+    watch_config = scheduler_config.get('watch', {}) or {}
+    check_seconds = 60
+    
+    if watch_config.get('enabled', False):
+        # 监视模式：频繁轮询服务列表，全量爬取按较慢的节奏执行
+        poll_seconds = watch_config.get('poll_seconds', 30)
+        full_sweep_minutes = watch_config.get('full_sweep_minutes', 60)
+        check_seconds = min(check_seconds, poll_seconds)
+        schedule.every(poll_seconds).seconds.do(tdh.run_watch_tick)
+        schedule.every(full_sweep_minutes).minutes.do(tdh.run_scheduled_task)
+        logger.info(f"监视模式已启动，每 {poll_seconds} 秒检查服务状态，每 {full_sweep_minutes} 分钟全量爬取一次")
+    else:
+        # 设置定时任务
+        schedule.every(interval_minutes).minutes.do(tdh.run_scheduled_task)
+        logger.info(f"定时调度器已启动，每 {interval_minutes} 分钟执行一次")
+    return check_seconds
 
 
 def run_scheduler(config_manager: ConfigManager):
     """
     运行定时调度器
     
+    启用 scheduler.hot_reload 时每次检查都会比较配置文件的修改时间，
+    配置变化后只重建受影响的组件和定时任务。
+    
     Args:
         config_manager: 配置管理器
     """
+    import schedule
+    
     scheduler_config = config_manager.get_scheduler_config()
-    interval_minutes = scheduler_config.get('interval_minutes', 1)
+    hot_reload = scheduler_config.get('hot_reload', True)
     
     tdh = TDHAutoLogin(config_manager)
 
     tdh.run_scheduled_task()
     
-    # 设置定时任务
-    schedule.every(interval_minutes).minutes.do(tdh.run_scheduled_task)
-    
-    logger.info(f"定时调度器已启动，每 {interval_minutes} 分钟执行一次")
+    check_seconds = _schedule_jobs(schedule, tdh, scheduler_config)
     
     try:
         while True:
+            if hot_reload:
+                changed_sections = config_manager.reload_if_changed()
+                if changed_sections:
+                    tdh.apply_config_changes(changed_sections)
+                    if 'scheduler' in changed_sections:
+                        schedule.clear()
+                        check_seconds = _schedule_jobs(schedule, tdh, config_manager.get_scheduler_config())
             schedule.run_pending()
-            time.sleep(60)  # 每分钟检查一次
+            time.sleep(check_seconds)  # 默认每分钟检查一次
     except KeyboardInterrupt:
         logger.info("定时调度器已停止")
+    finally:
+        tdh.shutdown()
 
 
-def main():
-    """主函数"""
+def main(config_file: str = "config.yaml", profile: bool = False):
+    """
+    主函数
+    
+    Args:
+        config_file: 配置文件路径
+        profile: 是否分阶段记录性能分析数据（覆盖配置文件中的 output.profile）
+    """
     try:
         # 加载配置
-        config_manager = ConfigManager()
-        
-        # 创建TDH自动登录实例
-        tdh = TDHAutoLogin(config_manager)
+        config_manager = ConfigManager(config_file)
+        if profile:
+            config_manager.config.setdefault('output', {})['profile'] = True
         
         # 检查是否启用定时任务
         scheduler_config = config_manager.get_scheduler_config()
         if scheduler_config.get('enabled', False):
-            # 运行定时调度器
+            # 运行定时调度器（调度器自行创建并关闭TDH自动登录实例）
             run_scheduler(config_manager)
         else:
-            # 运行完整流程（包括数据库更新）
-            tdh.run_full_process()
+            # 创建TDH自动登录实例，运行完整流程（包括数据库更新）
+            tdh = TDHAutoLogin(config_manager)
+            try:
+                tdh.run_full_process()
+            finally:
+                tdh.shutdown()
             
     except FileNotFoundError as e:
         logger.error(f"配置文件错误: {str(e)}")
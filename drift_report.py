@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨集群配置漂移报告
+基于爬取输出的CSV文件，按 (服务类型, 服务版本, 配置文件, 配置名) 分组，
+找出同一版本的服务在不同集群间取值不一致的配置
+
+每个输入路径视为一个来源（一个TDH管理节点的爬取输出），服务实例以 "来源:集群ID/服务名" 标识，
+不同管理节点上相同的集群ID和服务名（如默认的 1/hdfs1）不会互相覆盖
+
+只依赖标准库，逐行读取CSV并在一次哈希遍历中完成统计，
+内存占用与 分组数 × 集群数 成正比，与行数无关
+"""
+
+import csv
+import glob
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+DRIFT_FIELDNAMES = [
+    'service_type', 'service_version', 'config_configFile', 'config_name',
+    'instances', 'distinct_values', 'majority_value', 'majority_count', 'outliers'
+]
+
+
+def find_crawl_csv_files(paths: Iterable[str], latest: bool = False) -> List[Tuple[str, str]]:
+    """
+    展开输入路径：目录下递归查找 tdh_configs_*.csv，文件原样保留
+
+    Args:
+        paths: 文件或目录列表，每个路径是一个来源
+        latest: 目录来源只保留最新CSV所在的文件夹（最近一次全量爬取及其后监视模式轮询写入的CSV），
+            不读取更早的历史爬取
+
+    Returns:
+        List[Tuple[str, str]]: 按修改时间从新到旧排序的 (来源, CSV文件) 列表
+    """
+    files = {}
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, '**', 'tdh_configs_*.csv'), recursive=True)
+            if latest and found:
+                newest_dir = os.path.dirname(max(found, key=os.path.getmtime))
+                found = [filepath for filepath in found if os.path.dirname(filepath) == newest_dir]
+            for filepath in found:
+                files.setdefault(filepath, path)
+        else:
+            files.setdefault(path, path)
+    return sorted(((source, filepath) for filepath, source in files.items()),
+                  key=lambda item: os.path.getmtime(item[1]), reverse=True)
+
+
+def collect_config_values(csv_files: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str, str, str], Dict[str, str]]:
+    """
+    一次遍历所有CSV行，按分组键收集每个服务实例的取值
+
+    服务实例以 "来源:集群ID/服务名" 标识。文件从新到旧处理，每个实例只取它出现的最新文件中的行，
+    更早文件中该实例的行（包括升级前版本的取值）直接跳过，不进入分组，
+    内存只与当前的实例数有关，与历史文件数无关。
+
+    Args:
+        csv_files: (来源, CSV文件) 列表（按时间从新到旧排序）
+
+    Returns:
+        Dict: {(服务类型, 服务版本, 配置文件, 配置名): {服务实例: 配置值}}
+    """
+    groups = {}
+    # 服务实例 -> 取值所在文件的序号
+    taken = {}
+    for file_index, (source, filepath) in enumerate(csv_files):
+        with open(filepath, 'r', newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                instance = f"{source}:{row.get('cluster_id', '')}/{row.get('service_name', '')}"
+                if taken.setdefault(instance, file_index) != file_index:
+                    continue
+                key = (
+                    row.get('service_type', ''),
+                    row.get('service_version', ''),
+                    row.get('config_configFile', ''),
+                    row.get('config_name', '')
+                )
+                groups.setdefault(key, {})[instance] = row.get('config_value', '')
+    return groups
+
+
+def build_drift_rows(groups: Dict[Tuple[str, str, str, str], Dict[str, str]],
+                     min_instances: int = 2) -> List[Dict]:
+    """
+    计算每个分组的取值基数，输出取值不一致的分组
+
+    出现次数最多的取值视为基线，其余取值及其所在实例作为离群值列出。
+
+    Args:
+        groups: collect_config_values 的结果
+        min_instances: 至少有多少个服务实例才参与比较
+
+    Returns:
+        List[Dict]: 漂移表，按不同取值数量和实例数降序排列
+    """
+    rows = []
+    for (service_type, service_version, config_file, config_name), values in groups.items():
+        if len(values) < min_instances:
+            continue
+        counts = Counter(values.values())
+        if len(counts) < 2:
+            continue
+
+        majority_value, majority_count = counts.most_common(1)[0]
+        outliers = {}
+        for instance, value in sorted(values.items()):
+            if value != majority_value:
+                outliers.setdefault(value, []).append(instance)
+
+        rows.append({
+            'service_type': service_type,
+            'service_version': service_version,
+            'config_configFile': config_file,
+            'config_name': config_name,
+            'instances': len(values),
+            'distinct_values': len(counts),
+            'majority_value': majority_value,
+            'majority_count': majority_count,
+            'outliers': '; '.join(f"{value!r}: {','.join(instances)}" for value, instances in outliers.items())
+        })
+
+    rows.sort(key=lambda row: (-row['distinct_values'], -row['instances'],
+                               row['service_type'], row['config_name']))
+    return rows
+
+
+def write_drift_report(rows: List[Dict], output_file: str) -> str:
+    """
+    保存漂移表到CSV文件
+
+    Args:
+        rows: 漂移表
+        output_file: 输出文件路径
+
+    Returns:
+        str: 输出文件路径
+    """
+    with open(output_file, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=DRIFT_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+    return output_file
+
+
+def generate_drift_report(paths: Iterable[str], output_file: str, min_instances: int = 2,
+                          latest: bool = False) -> Dict:
+    """
+    生成跨集群配置漂移报告
+
+    Args:
+        paths: 爬取输出的CSV文件或目录（每个路径是一个来源）
+        output_file: 输出文件路径
+        min_instances: 至少有多少个服务实例才参与比较
+        latest: 目录来源只读取最新一次全量爬取所在的文件夹
+
+    Returns:
+        Dict: 报告摘要
+    """
+    csv_files = find_crawl_csv_files(paths, latest)
+    groups = collect_config_values(csv_files)
+    rows = build_drift_rows(groups, min_instances)
+    write_drift_report(rows, output_file)
+    return {
+        "csv_files": len(csv_files),
+        "config_groups": len(groups),
+        "drifted_configs": len(rows),
+        "output_file": output_file
+    }
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置值规范化
+把一次爬取的配置行批量转换为带类型的列：数值、布尔值、带单位的容量（字节）和时长（秒），
+可选值列表展开为单独的表，并标记与推荐值不一致的配置
+
+依赖NumPy：同一取值在不同服务、集群间大量重复，每列先按唯一值（哈希）分解，
+每个唯一值只解析一次，再通过索引数组广播回所有行；比较和标记都是整列运算。
+安装pyarrow时输出Parquet，否则输出CSV
+"""
+
+import ast
+import csv
+import math
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # 可选依赖，未安装时输出CSV
+    pyarrow = None
+
+KEY_COLUMNS = [
+    'cluster_id', 'service_name', 'service_type', 'service_version', 'config_configFile', 'config_name'
+]
+
+# 取值类型
+KINDS = ('empty', 'boolean', 'number', 'size', 'duration', 'size_or_duration', 'string')
+NUMERIC_KINDS = ('number', 'size', 'duration', 'size_or_duration')
+
+# 容量单位（换算为字节）
+SIZE_UNITS = {'b': 1}
+for _power, _prefix in enumerate(('k', 'm', 'g', 't', 'p'), start=1):
+    SIZE_UNITS[_prefix] = SIZE_UNITS[_prefix + 'b'] = SIZE_UNITS[_prefix + 'ib'] = 1024 ** _power
+
+# 单独的 m 既可能是MB（Java/Hadoop的容量写法）也可能是分钟（如 30m），解析为 size_or_duration，
+# 按另一侧取值的类型换算
+del SIZE_UNITS['m']
+AMBIGUOUS_UNIT = 'm'
+AMBIGUOUS_SCALES = {'size': 1024 ** 2, 'duration': 60}
+
+# 时长单位（换算为秒）
+DURATION_UNITS = {
+    'ns': 1e-9, 'us': 1e-6, 'ms': 1e-3,
+    's': 1, 'sec': 1, 'secs': 1, 'second': 1, 'seconds': 1,
+    'min': 60, 'mins': 60, 'minute': 60, 'minutes': 60,
+    'h': 3600, 'hr': 3600, 'hour': 3600, 'hours': 3600,
+    'd': 86400, 'day': 86400, 'days': 86400
+}
+
+TRUE_VALUES = {'true', 'yes', 'on'}
+FALSE_VALUES = {'false', 'no', 'off'}
+
+_QUANTITY_PATTERN = re.compile(r'^([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-zA-Z]*)$')
+
+
+def _text(value) -> str:
+    """统一为字符串（None为空字符串），内存中的爬取结果可能包含数值或布尔值"""
+    return '' if value is None else str(value)
+
+
+def _parse_scalar(text: str) -> Tuple[str, str, float, float]:
+    """
+    解析单个取值
+
+    Returns:
+        tuple: (去除首尾空白的文本, 类型, 数值（容量为字节、时长为秒，单独的 m 为未换算的数值）, 布尔值（1.0/0.0）)
+    """
+    text = text.strip()
+    if not text:
+        return text, 'empty', math.nan, math.nan
+
+    lowered = text.lower()
+    if lowered in TRUE_VALUES:
+        return text, 'boolean', math.nan, 1.0
+    if lowered in FALSE_VALUES:
+        return text, 'boolean', math.nan, 0.0
+
+    match = _QUANTITY_PATTERN.match(text)
+    if match:
+        number = float(match.group(1))
+        unit = match.group(2).lower()
+        if not unit:
+            return text, 'number', number, math.nan
+        if unit == AMBIGUOUS_UNIT:
+            return text, 'size_or_duration', number, math.nan
+        if unit in SIZE_UNITS:
+            return text, 'size', number * SIZE_UNITS[unit], math.nan
+        if unit in DURATION_UNITS:
+            return text, 'duration', number * DURATION_UNITS[unit], math.nan
+    return text, 'string', math.nan, math.nan
+
+
+def _parse_list(text: str) -> List[str]:
+    """解析可选值列表（CSV中为Python列表的字符串形式，数据库中为JSON）"""
+    text = text.strip()
+    if not text:
+        return []
+    try:
+        values = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return [text]
+    if isinstance(values, (list, tuple)):
+        return [_text(value) for value in values]
+    return [_text(values)]
+
+
+def _factorize(column: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按唯一值分解一列（哈希分解，不需要排序）
+
+    Returns:
+        tuple: (按首次出现顺序排列的唯一值, 每行对应的唯一值序号)
+    """
+    index = {}
+    inverse = np.fromiter((index.setdefault(value, len(index)) for value in column), dtype=np.int64)
+    uniques = np.empty(len(index), dtype=object)
+    uniques[:] = list(index)
+    return uniques, inverse
+
+
+def parse_column(column: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    解析一列取值：每个唯一值只解析一次，再广播回所有行
+
+    Args:
+        column: 字符串列（object数组）
+
+    Returns:
+        Dict: text（去除首尾空白）、kind、number、bool 四列
+    """
+    uniques, inverse = _factorize(column)
+    parsed = [_parse_scalar(value) for value in uniques]
+    texts = np.empty(len(parsed), dtype=object)
+    texts[:] = [item[0] for item in parsed]
+    return {
+        'text': texts[inverse],
+        'kind': np.array([item[1] for item in parsed], dtype=object)[inverse],
+        'number': np.array([item[2] for item in parsed], dtype=np.float64)[inverse],
+        'bool': np.array([item[3] for item in parsed], dtype=np.float64)[inverse]
+    }
+
+
+def rows_to_columns(rows: Iterable[Dict]) -> Dict[str, np.ndarray]:
+    """
+    把爬取的配置行（内存中的结果或CSV行）转换为列
+
+    Returns:
+        Dict: 分组键、取值、推荐值和可选值列（object数组）
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    columns = {}
+    for field in KEY_COLUMNS + ['config_value', 'config_recommendedValue', 'config_values']:
+        # 只对唯一值做字符串转换
+        uniques, inverse = _factorize([row.get(field) for row in rows])
+        texts = np.empty(len(uniques), dtype=object)
+        texts[:] = [_text(value) for value in uniques]
+        columns[field] = texts[inverse]
+    return columns
+
+
+def resolve_ambiguous(parsed: Dict[str, np.ndarray], other_kind: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    按另一侧取值的类型确定单独的 m 的含义
+
+    另一侧为容量时按MB换算为字节，为时长时按分钟换算为秒；两侧都是单独的 m 时单位相同，
+    保留 size_or_duration 和未换算的数值以便直接比较；其余情况无法确定单位，数值为NaN。
+
+    Args:
+        parsed: parse_column 的结果
+        other_kind: 另一侧取值的类型列
+
+    Returns:
+        Dict: 换算后的 parse_column 结果
+    """
+    ambiguous = parsed['kind'] == 'size_or_duration'
+    if not ambiguous.any():
+        return parsed
+    kind = parsed['kind'].copy()
+    number = parsed['number'].copy()
+    unresolved = ambiguous & (other_kind != 'size_or_duration')
+    for target, scale in AMBIGUOUS_SCALES.items():
+        resolved = ambiguous & (other_kind == target)
+        kind[resolved] = target
+        number[resolved] *= scale
+        unresolved &= ~resolved
+    number[unresolved] = np.nan
+    return dict(parsed, kind=kind, number=number)
+
+
+def flag_recommended(value: Dict[str, np.ndarray], recommended: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    批量标记与推荐值不一致的配置（没有推荐值的配置不标记）
+
+    数值、容量和时长在类型相同时按换算后的数值比较（如 1g 与 1024m 相同，1h 与 60m 相同），
+    布尔值按真假比较，其余按去除首尾空白后的文本比较。单独的 m 需先经 resolve_ambiguous 换算。
+
+    Returns:
+        np.ndarray: 布尔列
+    """
+    same_kind = value['kind'] == recommended['kind']
+    numeric = same_kind & np.isin(value['kind'], NUMERIC_KINDS)
+    boolean = same_kind & (value['kind'] == 'boolean')
+
+    equal = value['text'] == recommended['text']
+    equal = np.where(numeric, np.isclose(value['number'], recommended['number']), equal)
+    equal = np.where(boolean, value['bool'] == recommended['bool'], equal)
+    return (recommended['kind'] != 'empty') & ~equal.astype(bool)
+
+
+def explode_options(columns: Dict[str, np.ndarray], value: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    展开可选值列表：每个可选值一行
+
+    每个唯一的列表字符串只解析一次，展开时只做数组运算。可选值中单独的 m 按当前取值的类型换算。
+
+    Args:
+        columns: rows_to_columns 的结果
+        value: 当前取值的 parse_column 结果，用于标记当前选中的可选值
+
+    Returns:
+        Dict: row_index（对应规范化表的行号）、分组键、option 及其类型和数值、is_current
+    """
+    uniques, inverse = _factorize(columns['config_values'])
+    parsed = [_parse_list(value) for value in uniques]
+    unique_lengths = np.array([len(options) for options in parsed], dtype=np.int64)
+    unique_starts = np.concatenate(([0], np.cumsum(unique_lengths)[:-1])).astype(np.int64)
+    flat_options = np.empty(int(unique_lengths.sum()), dtype=object)
+    flat_options[:] = [option for options in parsed for option in options]
+
+    lengths = unique_lengths[inverse]
+    row_index = np.repeat(np.arange(len(inverse)), lengths)
+    # 每个输出行在所属列表中的位置 = 全局位置 - 该行第一个可选值的全局位置
+    row_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.arange(len(row_index)) - row_starts
+    options = flat_options[unique_starts[inverse[row_index]] + positions]
+
+    parsed_options = parse_column(options) if len(options) else {
+        'text': options, 'kind': options, 'number': np.empty(0), 'bool': np.empty(0)
+    }
+    parsed_options = resolve_ambiguous(parsed_options, value['kind'][row_index])
+    option_number = np.where(parsed_options['kind'] == 'size_or_duration', np.nan, parsed_options['number'])
+    exploded = {'row_index': row_index}
+    for field in KEY_COLUMNS:
+        exploded[field] = columns[field][row_index]
+    exploded.update({
+        'option': parsed_options['text'],
+        'option_kind': parsed_options['kind'],
+        'option_number': option_number,
+        'is_current': parsed_options['text'] == value['text'][row_index]
+    })
+    return exploded
+
+
+def normalize_rows(rows: Iterable[Dict]) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    规范化一次爬取的配置行
+
+    Args:
+        rows: 配置行（内存中的爬取结果或CSV行）
+
+    Returns:
+        tuple: (规范化表, 展开的可选值表)，均为 {列名: 数组}
+    """
+    columns = rows_to_columns(rows)
+    value = parse_column(columns['config_value'])
+    recommended = parse_column(columns['config_recommendedValue'])
+    value, recommended = (resolve_ambiguous(value, recommended['kind']),
+                          resolve_ambiguous(recommended, value['kind']))
+    differs = flag_recommended(value, recommended)
+    # 两侧都是单独的 m 时已按相同单位比较，输出中单位仍无法确定
+    for parsed in (value, recommended):
+        parsed['number'] = np.where(parsed['kind'] == 'size_or_duration', np.nan, parsed['number'])
+
+    table = {field: columns[field] for field in KEY_COLUMNS}
+    table.update({
+        'value': columns['config_value'],
+        'value_kind': value['kind'],
+        'value_number': value['number'],
+        'value_bool': value['bool'],
+        'recommended': columns['config_recommendedValue'],
+        'recommended_kind': recommended['kind'],
+        'recommended_number': recommended['number'],
+        'recommended_bool': recommended['bool'],
+        'differs_from_recommended': differs
+    })
+    return table, explode_options(columns, value)
+
+
+def read_crawl_csv(filepath: str) -> List[Dict]:
+    """读取爬取输出的CSV文件"""
+    with open(filepath, 'r', newline='', encoding='utf-8-sig') as f:
+        return list(csv.DictReader(f))
+
+
+def write_table(table: Dict[str, np.ndarray], filepath: str) -> str:
+    """
+    保存列表：安装pyarrow时保存为Parquet，否则保存为CSV（缺失的数值为空）
+
+    Args:
+        table: {列名: 数组}
+        filepath: 不含扩展名的文件路径
+
+    Returns:
+        str: 保存的文件路径
+    """
+    if pyarrow is not None:
+        filepath += '.parquet'
+        pyarrow.parquet.write_table(pyarrow.table({name: pyarrow.array(column) for name, column in table.items()}),
+                                    filepath)
+        return filepath
+
+    filepath += '.csv'
+    names = list(table)
+    formatted = []
+    for name in names:
+        column = table[name]
+        if column.dtype == np.float64:
+            # 数值列按整列格式化，NaN写为空
+            text = column.astype(str).astype(object)
+            text[np.isnan(column)] = ''
+            formatted.append(text)
+        else:
+            formatted.append(column)
+    with open(filepath, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(zip(*formatted))
+    return filepath
+
+
+def normalize_crawl(rows: Iterable[Dict], output_dir: str, timestamp: str) -> Dict:
+    """
+    规范化一次爬取并保存规范化表和展开的可选值表
+
+    Args:
+        rows: 配置行
+        output_dir: 输出目录
+        timestamp: 文件名中的时间戳
+
+    Returns:
+        Dict: 摘要
+    """
+    start = time.perf_counter()
+    table, options = normalize_rows(rows)
+    kinds, counts = np.unique(table['value_kind'], return_counts=True)
+    summary = {
+        "rows": len(table['value']),
+        "option_rows": len(options['option']),
+        "value_kinds": {str(kind): int(count) for kind, count in zip(kinds, counts)},
+        "differs_from_recommended": int(table['differs_from_recommended'].sum()),
+        "normalize_seconds": round(time.perf_counter() - start, 3)
+    }
+    summary["table_file"] = write_table(table, os.path.join(output_dir, f"normalized_configs_{timestamp}"))
+    summary["options_file"] = write_table(options, os.path.join(output_dir, f"normalized_options_{timestamp}"))
+    return summary
@@ -21,20 +21,16 @@ if not exist "config.yaml" (
     exit /b 1
 )
 
-REM 运行环境检查
-echo 正在检查环境...
-python check_environment.py
+REM 运行主脚本（环境检查由 cli.py 完成，结果会被缓存）
+echo.
+echo 开始运行TDH自动登录脚本...
+python cli.py run
 if errorlevel 1 (
-    echo 环境检查失败，请解决上述问题后重试
+    echo 环境检查失败，请运行 python check_environment.py 解决问题后重试
     pause
     exit /b 1
 )
 
-REM 运行主脚本
-echo.
-echo 开始运行TDH自动登录脚本...
-python config.py
-
 echo.
 echo 脚本执行完成
 pause 
\ No newline at end of file
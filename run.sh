@@ -20,18 +20,14 @@ if [ ! -f "config.yaml" ]; then
     exit 1
 fi
 
-# 运行环境检查
-echo "正在检查环境..."
-python3 check_environment.py
+# 运行主脚本（环境检查由 cli.py 完成，结果会被缓存）
+echo ""
+echo "开始运行TDH自动登录脚本..."
+python3 cli.py run
 if [ $? -ne 0 ]; then
-    echo "环境检查失败，请解决上述问题后重试"
+    echo "环境检查失败，请运行 python3 check_environment.py 解决问题后重试"
     exit 1
 fi
 
-# 运行主脚本
-echo ""
-echo "开始运行TDH自动登录脚本..."
-python3 config.py
-
 echo ""
 echo "脚本执行完成" 
\ No newline at end of file